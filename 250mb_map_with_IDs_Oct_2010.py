@@ -1,4 +1,5 @@
 # This script reads-in CMIP5 data in netcdf format and is used to explore various output data.
+# To draw this map for any range of times without editing the script, use 'python ncep_batch.py jet-overlay' (see ncep_batch.py).
 
 # Import relevant packages; many of these come with Anaconda Python 2.7 version, but you will probably have to install the netCDF4 package.  This is installed on the met lab computers in Davis Hall.
 import matplotlib
@@ -8,8 +9,16 @@ import pylab as py
 import os
 import csv
 from netCDF4 import Dataset # This is important for reading in netCDF4 files below
+from ncep_reader import NCEPReader # Reads only the levels/times needed from the NCEP/NCAR .nc files
 import math
 from mpl_toolkits.basemap import Basemap
+from datetime import datetime
+from jet_store import JetStore # Memory-mapped jet ID files
+from map_products import jet_ids_on_ncep_grid # Lines the jet ID grids up with the NCEP/NCAR grid
+from instrument import start_run
+
+# Record the time, CPU, bytes read and memory of each stage when NCEP_RUN_REPORT is set (and a cProfile dump with NCEP_RUN_PROFILE)
+start_run('250mb_map_with_IDs_Oct_2010')
 
 # Create our data folder if we need to.
 currentFilePath = os.path.realpath(__file__)
@@ -18,24 +27,20 @@ trgDir = currentDir + '/Data/'
 if not os.path.exists(trgDir):
     os.makedirs(trgDir)	
 
-# Change directory to where data is stored
-os.chdir(trgDir) # Insert directory here or comment out if running script in directory where files are saved
-
 # Assign each nc file to variable to read in data
-nc_file_uwnd=Dataset('uwnd.2010.nc') # u-wind data
-nc_file_vwnd=Dataset('vwnd.2010.nc') # v-wind data
-nc_file_hgt=Dataset('hgt.2010.nc') # Geopotential height data
-nc_file_land=Dataset('land.nc') # Landmask
+reader=NCEPReader(trgDir,2010,('uwnd','vwnd','hgt'),levels=(250,)) # u-wind, v-wind and geopotential height data; only the 250 hPa level is read (see ncep_reader.py)
+nc_file_land=Dataset(trgDir+'land.nc') # Landmask
 
-# Load Data (2.5 deg horizontal resolution; 17 isobaric levels)
-lon=nc_file_uwnd.variables['lon'][:] # Vector of longitude values (144 longitudes)
-lat=nc_file_uwnd.variables['lat'][2:35] # Vector of latitude values; only selecting latitude values ranging from 5N to 85N (Python index values 2:35), since that is the latitude range of the jet ID data (33 latitudes selected)
-p=nc_file_uwnd.variables['level'][:] # Vector of isobaric levels (17)
+# Load Data (2.5 deg horizontal resolution; 17 isobaric levels in the files)
+lon=reader.lon # Vector of longitude values (144 longitudes)
+lat=reader.lat # Vector of latitude values; only selecting latitude values ranging from 5N to 85N (Python index values 2:35), since that is the latitude range of the jet ID data (33 latitudes selected)
+p=reader.level # Vector of isobaric levels read (250 hPa)
 
-# Load u, v and geopotential height data; dimensions of data are times (1460 6-hrly times starting at 00Z 1 Jan. 2010 and ending at 18Z 31 Dec. 2010) x isobaric levels (17) x latitudes (33 selected; see comment above) x longitudes (144)
-u=np.squeeze(nc_file_uwnd.variables['uwnd'][1194,:,2:35,:]) # u-wind on 26 Oct 2010 1200 UTC (Python index value 1194; index 0 is 00Z 1 Oct. 2010)
-v=np.squeeze(nc_file_vwnd.variables['vwnd'][1194,:,2:35,:]) # v-wind on 26 Oct 2010 1200 UTC (Python index value 1194; index 0 is 00Z 1 Oct. 2010)
-geo_hght=np.squeeze(nc_file_hgt.variables['hgt'][1194,:,2:35,:]) # Geo. Hght on 26 Oct 2010 1200 UTC (Python index value 1194; index 0 is 00Z 1 Oct. 2010)
+# Load u, v and geopotential height data; dimensions of data are isobaric levels (1 read) x latitudes (33 selected; see comment above) x longitudes (144)
+fields=reader.read_block(1194,1195) # 26 Oct 2010 1200 UTC (Python index value 1194; index 0 is 00Z 1 Jan. 2010)
+u=fields['uwnd'][0] # u-wind
+v=fields['vwnd'][0] # v-wind
+geo_hght=fields['hgt'][0] # Geo. Hght
 
 # Indexing
 ilat=len(lat) # 'ilat' represents the total number of latitude points for each longitude
@@ -57,34 +62,16 @@ ioct_date=oct_date-1 # Subtract 1 to get proper Python index value
 six_hr_time=0 # Enter '0' for 00Z, '6' for 06Z, '12' for 12Z or '18' for 18Z
 i6hr_time=six_hr_time/6 # Divide by 6 so '0' = 00Z, '1' = 06Z, '2' = 12Z and '3' = 18Z
 
-# Load in jet superposition ID Data
-os.chdir(trgDir) # Insert directory here or comment out if running script in directory where files are saved
-ovrlp_matrix_2d=np.loadtxt('ovrlps_oct_2010_NCEP_python.txt') # Load .txt file of jet superposition ID's
-ovrlp_ids=ovrlp_matrix_2d.reshape(ilat,ilon,iday,ihr) # The variable 'ovrlp_ids' will have dimensions lat x lon x # days in October x 4 6-hr periods (00Z, 06Z, 12Z and 18Z)
-ovrlp_case=np.squeeze(ovrlp_ids[:,:,ioct_date,i6hr_time]) # This line selects overlap data for all latitude and longitude points for date/time specified earlier
-
-# Load in polar ID Data
-os.chdir(trgDir) # Insert directory here or comment out if running script in directory where files are saved
-polj_matrix_2d=np.loadtxt('poljs_oct_2010_NCEP_python.txt') # Load .txt file of polar jet ID's
-polj_ids=polj_matrix_2d.reshape(ilat,ilon,iday,ihr) # The variable 'ovrlp_ids' will have dimensions lat x lon x # days in October x 4 6-hr periods (00Z, 06Z, 12Z and 18Z)
-polj_case=np.squeeze(polj_ids[:,:,ioct_date,i6hr_time]) # This line selects overlap data for all latitude and longitude points for date/time specified earlier
-
-# Load in subtropical jet ID Data
-os.chdir(trgDir) # Insert directory here or comment out if running script in directory where files are saved
-stj_matrix_2d=np.loadtxt('stjs_oct_2010_NCEP_python.txt') # Load .txt file of subtropical jet ID's
-stj_ids=stj_matrix_2d.reshape(ilat,ilon,iday,ihr) # The variable 'ovrlp_ids' will have dimensions lat x lon x # days in October x 4 6-hr periods (00Z, 06Z, 12Z and 18Z)
-stj_case=np.squeeze(stj_ids[:,:,ioct_date,i6hr_time]) # This line selects overlap data for all latitude and longitude points for date/time specified earlier
-
-# For loop that shifts all points 180 degrees in the jet ID data to line up with NCEP/NCAR Reanalysis 1 Data for each latitude
-for i in range(0,ilat):
-    ovrlp_case[i,:]=np.roll(ovrlp_case[i,:],72)
-    polj_case[i,:]=np.roll(polj_case[i,:],72)
-    stj_case[i,:]=np.roll(stj_case[i,:],72)
-
-# Flip latitude dimension to line up ovrlps with NCEP/NCAR Reanalysis 1 Data
-ovrlp_case=np.flipud(ovrlp_case)
-polj_case=np.flipud(polj_case)
-stj_case=np.flipud(stj_case)
+# Load in polar, subtropical and jet superposition ID Data (one file with all three classes, written by jet_binning_ncep_oct2010.py)
+# The file is memory-mapped, so only the grids for the date/time specified above are read from disk
+jet_store=JetStore(trgDir+'jet_ids_oct_2010_NCEP.jetid')
+case_time=datetime(2010,10,oct_date,six_hr_time) # Date/time specified earlier
+# Select polar, subtropical and overlap data for all latitude and longitude points for date/time specified earlier, shifted in longitude
+# and flipped in latitude to line up with NCEP/NCAR Reanalysis 1 Data (the same grids 'python ncep_batch.py jet-overlay' draws)
+jet_ids=jet_ids_on_ncep_grid(jet_store.read_time(case_time))
+polj_case=jet_ids[jet_store.classes.index('polj')]
+stj_case=jet_ids[jet_store.classes.index('stj')]
+ovrlp_case=jet_ids[jet_store.classes.index('ovrlp')]
 
 # Plot Data with ID's
 contour_lvls_wind=[30,40,50,60,70,80,90,100] # Contour levels for wind at 250 hPa
@@ -92,10 +79,7 @@ contour_lvls_wind=[30,40,50,60,70,80,90,100] # Contour levels for wind at 250 hP
 matplotlib.rcParams.update({'font.size': 6})
 
 m = Basemap(projection='ortho',lat_0=45,lon_0=-100,resolution='l')
-ny = ovrlp_case.shape[0] 
-nx = ovrlp_case.shape[1]
-lons, lats = m.makegrid(nx, ny)
-x, y = m(lons, lats)
+x, y = m(*np.meshgrid(lon, lat)) # Map coordinates of the NCEP/NCAR grid points
 m.drawcoastlines()
 m.drawstates()
 m.drawcountries()
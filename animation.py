@@ -0,0 +1,112 @@
+# This module writes the frames of a time loop (e.g. a month of 6-hourly maps) into one animation file instead of one PNG per frame.
+# Frames are taken straight from the figure's canvas as RGBA arrays (map_render.MapFigure.render with no filename) and handed to the
+# writer; nothing is written to disk per frame. When ffmpeg is on the PATH the frames are piped into it as raw video and encoded to
+# MP4; otherwise Pillow writes an animated GIF (or PNG). Pillow cannot write those one frame at a time, so it keeps every frame in
+# memory until the file is closed, as a 256 color palette image (one byte per pixel): use a preview dpi (PREVIEW_DPI) for long loops.
+
+import os
+import subprocess
+from shutil import which
+import numpy as np
+
+DEFAULT_FPS = 4    # Frames per second (one day of 6-hourly maps per second)
+PREVIEW_DPI = 72   # Resolution of quick preview frames, instead of the 300 dpi of the figures
+FORMATS = ('mp4', 'gif', 'png')
+
+
+# Path of the ffmpeg executable, or None
+def ffmpeg_path():
+    return which('ffmpeg')
+
+
+# Format used for 'auto': MP4 when ffmpeg is installed, else GIF
+def default_format():
+    return 'mp4' if ffmpeg_path() else 'gif'
+
+
+# Frames piped into ffmpeg and encoded as H.264 MP4. The frame size is set by the first frame.
+class FFmpegWriter(object):
+
+    def __init__(self, path, fps=DEFAULT_FPS):
+        self.path = path
+        self.fps = fps
+        self.process = None
+        self.shape = None
+
+    def _start(self, shape):
+        self.shape = shape
+        height, width = shape[:2]
+        command = [ffmpeg_path(), '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', '%dx%d' % (width, height), '-r', str(self.fps), '-i', '-',
+                   '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2:color=white', # yuv420p needs an even width and height
+                   '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', self.path]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def add(self, frame):
+        if self.process is None:
+            self._start(frame.shape)
+        if frame.shape != self.shape:
+            raise ValueError('frame of size %s in an animation of size %s' % (frame.shape, self.shape))
+        self.process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+
+    def close(self):
+        if self.process is None:
+            return
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise IOError('ffmpeg failed writing %s' % self.path)
+        self.process = None
+
+    # Stop ffmpeg without finishing the file (after an error) and remove what it wrote; does nothing once closed
+    def abort(self):
+        if self.process is None:
+            return
+        self.process.kill()
+        try:
+            self.process.stdin.close()
+        except (IOError, OSError): # Broken pipe
+            pass
+        self.process.wait()
+        self.process = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# Frames written by Pillow as an animated GIF or PNG when the writer is closed
+class PillowWriter(object):
+
+    def __init__(self, path, fps=DEFAULT_FPS):
+        self.path = path
+        self.fps = fps
+        self.frames = []
+
+    def add(self, frame):
+        from PIL import Image
+        if self.frames and self.frames[0].size != (frame.shape[1], frame.shape[0]):
+            raise ValueError('frame of size %s in an animation of size %s' % (frame.shape, self.frames[0].size))
+        image = Image.fromarray(np.ascontiguousarray(frame[:, :, :3], dtype=np.uint8))
+        self.frames.append(image.quantize(256))
+
+    def close(self):
+        if not self.frames:
+            return
+        self.frames[0].save(self.path, save_all=True, append_images=self.frames[1:], duration=int(1000. / self.fps), loop=0)
+        self.frames = []
+
+    # Drop the frames without writing the file (after an error)
+    def abort(self):
+        self.frames = []
+
+
+# Writer of the animation 'basename' + extension in format 'mp4', 'gif', 'png' (animated PNG) or 'auto' (see default_format)
+def open_animation(basename, format='auto', fps=DEFAULT_FPS):
+    if format == 'auto':
+        format = default_format()
+    if format not in FORMATS:
+        raise ValueError('unknown animation format %r; choose from auto, %s' % (format, ', '.join(FORMATS)))
+    path = basename + '.' + format
+    if format == 'mp4':
+        if ffmpeg_path() is None:
+            raise IOError('MP4 animations need ffmpeg on the PATH')
+        return FFmpegWriter(path, fps)
+    return PillowWriter(path, fps)
@@ -0,0 +1,19 @@
+# This module writes files so that a reader only ever finds a complete one: the data goes to a temporary file next to the target (named
+# after the process, so processes writing the same file at once do not mix their data), which then replaces the target in one step with
+# os.replace, atomic on Windows as well as POSIX. A write that is interrupted leaves the old file (or none) in place and removes its
+# temporary file.
+
+import os
+from contextlib import contextmanager
+
+
+# Path of a temporary file to write 'path' through: it replaces 'path' when the with block finishes and is removed if the block fails
+@contextmanager
+def replacing(path):
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
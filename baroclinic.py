@@ -0,0 +1,94 @@
+# This module computes the baroclinic instability diagnostics of the map scripts (baroclinic_instability_map.py, brunt_vaisala.py,
+# shear_map.py and triplot_baroclinic.py) for whole grids at once:
+#    Shear term:                  S  = (Vu - Vl) / (GHu - GHl)
+#    Brunt-Vaisala frequency:     N  = SQRT( (g/PTm) * ((PTu - PTl) / (GHu - GHl)) )
+#    Baroclinic instability:      BI = 0.31 * (f / N) * S,  f = 2 * Omega * sin(lat)
+# where V is the wind speed, PT the potential temperature and GH the geopotential height at the lower (l), middle (m) and upper (u)
+# levels. Fields are (... x level x lat x lon) arrays, so one time step (level x lat x lon) and a block of time steps
+# (time x level x lat x lon, e.g. from NCEPReader.read_block) both work; results have the level dimension removed.
+# Grid boxes where a term is undefined are set to NaN instead of raising math domain errors: zero thickness (GHu == GHl) for all
+# three terms, negative static stability for N and BI, and zero stability (N == 0) for BI.
+# All values are returned in SI units (s^-1, K, m); the scripts scale them for plotting.
+
+import numpy as np
+
+OMEGA = 7.29e-5         # Earth's rotation rate (s^-1)
+G = 9.81                # Gravitational acceleration (m/s^2)
+R_OVER_CP = 287. / 1004 # R/Cp for dry air
+P0 = 1000.              # Reference pressure for potential temperature (hPa)
+BI_COEFFICIENT = 0.31   # Eady growth rate coefficient
+SECONDS_PER_DAY = 86400.
+
+
+# Coriolis parameter (f = 2 * Omega * sin(lat)) for a vector of latitudes, shaped (lat x 1) so it broadcasts over (... x lat x lon)
+def coriolis(lat):
+    return (2 * OMEGA * np.sin(np.deg2rad(np.asarray(lat, dtype=np.float64))))[:, np.newaxis]
+
+
+# Potential temperature (PT = T (P0 / P) ^ (R/Cp)) of temperature at pressure p (hPa). p may also be the level vector of a
+# (... x level x lat x lon) field, giving the potential temperature at every level at once.
+def potential_temperature(T, p):
+    return T * ((P0 / np.asarray(p, dtype=np.float64)) ** R_OVER_CP)[..., np.newaxis, np.newaxis]
+
+
+# Wind speed (magnitude) from the u and v components
+def wind_speed(u, v):
+    return np.hypot(u, v)
+
+
+# The (... x lat x lon) slab of a (... x level x lat x lon) field at pressure level p (hPa); p_levels is the level vector of the field
+def at_level(field, p_levels, p):
+    found = np.flatnonzero(np.asarray(p_levels) == p)
+    if len(found) == 0:
+        raise ValueError('%s hPa is not one of the levels read: %s' % (p, [float(level) for level in p_levels]))
+    return np.asarray(field)[..., found[0], :, :]
+
+
+# a / b with NaN wherever b is zero (or either input is NaN)
+def _divide(a, b):
+    a, b = np.broadcast_arrays(a, b)
+    out = np.full(a.shape, np.nan, dtype=np.result_type(a, b, np.float32))
+    np.divide(a, b, out=out, where=b != 0)
+    return out
+
+
+# Thickness (GHu - GHl, m) between the lower and upper levels
+def thickness(geo_hght, p_levels, low, high):
+    return at_level(geo_hght, p_levels, high) - at_level(geo_hght, p_levels, low)
+
+
+# Vertical shear of the wind speed between the lower and upper levels (s^-1)
+def shear_term(u, v, geo_hght, p_levels, low=1000., high=500.):
+    return shear_from_speed(wind_speed(u, v), geo_hght, p_levels, low, high)
+
+
+# Same, from an already computed (... x level x lat x lon) wind speed
+def shear_from_speed(wVel, geo_hght, p_levels, low=1000., high=500.):
+    return _divide(at_level(wVel, p_levels, high) - at_level(wVel, p_levels, low), thickness(geo_hght, p_levels, low, high))
+
+
+# Brunt-Vaisala frequency (s^-1) from the potential temperature difference between the lower and upper levels, with the middle level
+# potential temperature as the reference; NaN where the layer is statically unstable
+def brunt_vaisala(T, geo_hght, p_levels, low=1000., mid=700., high=500.):
+    return brunt_vaisala_from_theta(potential_temperature(T, p_levels), geo_hght, p_levels, low, mid, high)
+
+
+# Same, from an already computed (... x level x lat x lon) potential temperature
+def brunt_vaisala_from_theta(PotTemp, geo_hght, p_levels, low=1000., mid=700., high=500.):
+    PTDif = at_level(PotTemp, p_levels, high) - at_level(PotTemp, p_levels, low)
+    N2 = G * _divide(_divide(PTDif, thickness(geo_hght, p_levels, low, high)), at_level(PotTemp, p_levels, mid))
+    N = np.full(N2.shape, np.nan, dtype=N2.dtype)
+    np.sqrt(N2, out=N, where=N2 >= 0) # NaN compares False, so NaN stays NaN
+    return N
+
+
+# Baroclinic instability (s^-1) from the Coriolis parameter, Brunt-Vaisala frequency and shear term; 'lat' is the latitude of each row
+def baroclinic_instability(N, shear, lat):
+    return BI_COEFFICIENT * _divide(coriolis(lat), N) * shear
+
+
+# All three terms for the given levels in one pass: returns (BI, N, Shear) as (... x lat x lon) arrays
+def baroclinic_terms(T, u, v, geo_hght, p_levels, lat, low=1000., mid=500., high=250.):
+    Shear = shear_term(u, v, geo_hght, p_levels, low, high)
+    N = brunt_vaisala(T, geo_hght, p_levels, low, mid, high)
+    return baroclinic_instability(N, Shear, lat), N, Shear
@@ -0,0 +1,349 @@
+# This script times each stage of the jet ID and diagnostic map processing on synthetic data (synthetic_data.py), so changes can be
+# compared on any machine without the reanalysis archive:
+#   parse    - reading the polj/stj/ovrlp .txt files (jet_id_reader.read_jet_id_file)
+#   bin      - gridding the parsed IDs into the (class x lat x lon x time) array (jet_binning.bin_jet_ids)
+#   read     - reading the air/uwnd/vwnd/hgt .nc files at the levels the map products use (ncep_reader.NCEPReader.iter_steps)
+#   compute  - the BI, Brunt-Vaisala and shear fields of every map product (diagnostics_pipeline.DerivedFields)
+#   render   - drawing and saving the figures of every map product for the first few time steps (map_products)
+# The results (seconds, CPU seconds, items and throughput per stage, plus the machine and library versions) are written as JSON, e.g.
+#   python benchmark.py --scale 0.05 --output results.json
+# --verify instead checks, on the same synthetic data, results that must not depend on how the work is split up, so a later change
+# cannot silently break them:
+#   jet_store - a store binned by worker processes (jet_store.bin_jet_ids_parallel) is byte-identical to a streamed one, with the
+#               same source manifest
+#   climatology - climatology.build_climatology with 2 workers equals a build with 1, and merging its parts of disjoint years
+#                 (Climatology.merge) agrees to rounding with accumulating the years one after another
+# and exits with status 1 if any check fails.
+# Each stage is run --repeat times and the fastest run is reported. A stage asked for without the stages before it gets its inputs made
+# first, outside the timing (see prepare_stage), so only its own work is timed. --scale 1 benchmarks a full year (1460 time steps, ~4 GB of data
+# decoded), generated once into --work-dir and reused by later runs.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import numpy as np
+
+RESULTS_VERSION = 1
+STAGES = ('parse', 'bin', 'read', 'compute', 'render')
+CHECKS = ('jet_store', 'climatology')
+YEAR = 2010
+
+
+# Wall and CPU seconds of the fastest of 'repeat' calls of run(), and what the last call returned
+def _time(run, repeat):
+    best = None
+    for _ in range(repeat):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        result = run()
+        timing = (time.perf_counter() - wall, time.process_time() - cpu)
+        if best is None or timing[0] < best[0]:
+            best = timing
+    return best, result
+
+
+def _jet_files(data_dir, times):
+    from jet_catalog import JET_CLASSES, jet_id_filename
+    return [os.path.join(data_dir, jet_id_filename(jet_class, valid_time)) for valid_time in times for jet_class in JET_CLASSES]
+
+
+def stage_parse(context):
+    from jet_id_reader import read_jet_id_file
+    paths = _jet_files(context['data_dir'], context['times'])
+    records = [read_jet_id_file(path, ids_only=True) for path in paths]
+    context['records'] = records
+    return {'items': len(paths), 'unit': 'files', 'bytes': sum(os.path.getsize(path) for path in paths)}
+
+
+def stage_bin(context):
+    from jet_catalog import JET_CLASSES
+    from jet_binning import NLAT, NLON, bin_jet_ids
+    times = context['times']
+    jet_ids = np.zeros((len(JET_CLASSES), NLAT, NLON, len(times)), dtype=np.uint8)
+    records = iter(context['records'])
+    for t in range(len(times)):
+        for c in range(len(JET_CLASSES)):
+            bin_jet_ids(jet_ids[c], next(records), t)
+    return {'items': len(times), 'unit': 'time steps', 'ids': int(jet_ids.sum())}
+
+
+def stage_read(context):
+    from ncep_reader import NCEPReader
+    reader = NCEPReader(context['data_dir'], YEAR, context['variables'], levels=context['levels'])
+    nbytes = 0
+    steps = []
+    try:
+        for t, fields in reader.iter_steps(0, reader.ntime):
+            nbytes += sum(field.nbytes for field in fields.values())
+            if len(steps) < context['keep_steps']:
+                steps.append(fields)
+        context['reader'] = (reader.level, reader.lat, reader.lon)
+        context['steps'] = steps
+        return {'items': reader.ntime, 'unit': 'time steps', 'bytes': nbytes,
+                'file_bytes': sum(os.path.getsize(path) for path in reader.paths.values())}
+    finally:
+        reader.close()
+
+
+def stage_compute(context):
+    from diagnostics_pipeline import DerivedFields
+    from ncep_reader import NCEPReader
+    products = context['products']
+    frames = []
+    seconds = cpu = 0.
+
+    # Reading is timed by the read stage; only the computation is timed here
+    def compute(t, fields, level, lat):
+        wall = time.perf_counter()
+        start = time.process_time()
+        derived = DerivedFields(fields, level, lat)
+        row = [product.fields(derived) for product in products.values()]
+        if len(frames) < context['frames']:
+            frames.append(row)
+        return time.perf_counter() - wall, time.process_time() - start
+
+    count = 0
+    if context['compute_all']:
+        reader = NCEPReader(context['data_dir'], YEAR, context['variables'], levels=context['levels'])
+        try:
+            context['grid'] = (reader.lat, reader.lon)
+            for t, fields in reader.iter_steps(0, reader.ntime):
+                wall, used = compute(t, fields, reader.level, reader.lat)
+                seconds += wall
+                cpu += used
+                count += 1
+        finally:
+            reader.close()
+    else:
+        level, lat, lon = context['reader']
+        context['grid'] = (lat, lon)
+        for t, fields in enumerate(context['steps']):
+            wall, used = compute(t, fields, level, lat)
+            seconds += wall
+            cpu += used
+            count += 1
+    context['frames_fields'] = frames
+    return {'items': count, 'unit': 'time steps', 'seconds': seconds, 'cpu_seconds': cpu}
+
+
+def stage_render(context):
+    from map_products import init_renderer, close_figures
+    products = context['products']
+    save_dir = os.path.join(context['work_dir'], 'Figures', '')
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+    lat, lon = context['grid'] # Latitudes and longitudes of the computed fields
+    init_renderer(None, False, context['dpi'])
+    first = None
+    try:
+        count = 0
+        for t, row in enumerate(context['frames_fields']):
+            valid_time = datetime(YEAR, 1, 1) + timedelta(hours=6 * t)
+            start = time.perf_counter()
+            for product, fields in zip(products.values(), row):
+                product.render(fields, lat, lon, t, valid_time, save_dir)
+                count += 1
+            if first is None:
+                first = time.perf_counter() - start # Includes making the figures and maps
+    finally:
+        close_figures() # Every repeat starts from new figures, like a new run
+        init_renderer(None)
+    return {'items': count, 'unit': 'frames', 'first_step_seconds': first}
+
+
+# Read only the first time steps the compute and render stages keep (context['steps']), for when the read stage is not run
+def _read_first_steps(context):
+    from ncep_reader import NCEPReader
+    reader = NCEPReader(context['data_dir'], YEAR, context['variables'], levels=context['levels'])
+    try:
+        context['steps'] = [fields for t, fields in reader.iter_steps(0, min(context['keep_steps'], reader.ntime))]
+        context['reader'] = (reader.level, reader.lat, reader.lon)
+    finally:
+        reader.close()
+
+
+# Make the inputs of stage 'name' that the stages before it would have left in the context, if they were not run. This is not timed;
+# the render stage only needs the fields of the frames it draws, so they are read and computed for those time steps alone.
+def prepare_stage(name, context):
+    if name == 'bin' and 'records' not in context:
+        stage_parse(context)
+    if name == 'compute' and not context['compute_all'] and 'steps' not in context:
+        _read_first_steps(context)
+    if name == 'render' and 'frames_fields' not in context:
+        if 'steps' not in context:
+            _read_first_steps(context)
+        prepared = dict(context, compute_all=False)
+        stage_compute(prepared)
+        context.update(frames_fields=prepared['frames_fields'], grid=prepared['grid'])
+
+
+STAGE_FUNCTIONS = {'parse': stage_parse, 'bin': stage_bin, 'read': stage_read, 'compute': stage_compute, 'render': stage_render}
+
+
+# Library versions and machine description for the results
+def environment():
+    versions = {'python': platform.python_version(), 'numpy': np.__version__}
+    for name in ('netCDF4', 'matplotlib', 'mpl_toolkits.basemap'):
+        try:
+            module = __import__(name, fromlist=['__version__'])
+            versions[name] = getattr(module, '__version__', 'unknown')
+        except ImportError:
+            versions[name] = None
+    return {'platform': platform.platform(), 'machine': platform.machine(), 'processor': platform.processor(),
+            'cpu_count': os.cpu_count(), 'versions': versions}
+
+
+# Write the synthetic data for 'scale' of a year into work_dir/Data unless it is there already; returns the folder and the 6-hourly times
+def write_data(work_dir, scale):
+    from synthetic_data import write_ncep_year, write_jet_id_files, steps_in_year
+    from jet_binning import jet_time_axis
+    data_dir = os.path.join(work_dir, 'Data')
+    if not os.path.exists(data_dir):
+        os.makedirs(data_dir)
+    ntime = max(1, int(round(steps_in_year(YEAR) * scale)))
+    times = jet_time_axis(datetime(YEAR, 1, 1), datetime(YEAR, 1, 1) + timedelta(hours=6 * ntime))
+    write_ncep_year(data_dir, YEAR, scale)
+    if not all(os.path.exists(path) for path in _jet_files(data_dir, times)):
+        write_jet_id_files(data_dir, times[0], times[-1] + timedelta(hours=6))
+    return data_dir, times
+
+
+# Generate the synthetic data (if needed) and time 'stages'; returns the results as a dict
+def run_benchmark(work_dir, scale=0.05, stages=STAGES, repeat=1, frames=2, dpi=72, compute_all=True, verbose=False):
+    from map_products import PRODUCTS
+    from diagnostics_pipeline import product_requirements
+    start = time.perf_counter()
+    data_dir, times = write_data(work_dir, scale)
+    ntime = len(times)
+    setup = time.perf_counter() - start
+    products = dict((name, PRODUCTS[name]) for name in sorted(PRODUCTS))
+    variables, levels = product_requirements(products.values())
+    context = {'work_dir': work_dir, 'data_dir': data_dir, 'times': times, 'products': products, 'variables': variables,
+               'levels': levels, 'frames': frames, 'keep_steps': frames, 'dpi': dpi, 'compute_all': compute_all}
+    results = {}
+    for name in stages:
+        prepare_stage(name, context)
+        (seconds, cpu), info = _time(lambda: STAGE_FUNCTIONS[name](context), repeat)
+        seconds = info.pop('seconds', seconds) # Stages that time only part of their work report it themselves
+        cpu = info.pop('cpu_seconds', cpu)
+        info.update({'seconds': seconds, 'cpu_seconds': cpu, 'per_second': info['items'] / seconds if seconds > 0 else None})
+        if 'bytes' in info and seconds > 0:
+            info['mb_per_second'] = info['bytes'] / seconds / 1e6
+        results[name] = info
+        if verbose:
+            print('%-8s %8.3f s  %8.1f %s/s' % (name, seconds, info['per_second'] or 0, info['unit']))
+    return {'version': RESULTS_VERSION, 'created': datetime.now().isoformat(), 'environment': environment(),
+            'config': {'scale': scale, 'time_steps': ntime, 'repeat': repeat, 'frames': frames, 'dpi': dpi, 'compute_all': compute_all,
+                       'variables': list(variables), 'levels': [float(p) for p in levels], 'products': sorted(products)},
+            'setup_seconds': setup, 'stages': results}
+
+
+# Bin the synthetic jet ID files into a streamed store and into a store binned by 2 worker processes (in blocks of a quarter of the
+# period, so the workers share it); the two must be the same byte for byte and record the same source files
+def check_jet_store(work_dir, data_dir, times):
+    from jet_store import stream_jet_ids, bin_jet_ids_parallel
+    from jet_catalog import SourceManifest, MANIFEST_SUFFIX
+    start, end = times[0], times[-1] + timedelta(hours=6)
+    paths = [os.path.join(work_dir, name) for name in ('streamed.jetid', 'parallel.jetid')]
+    for path in paths:
+        for name in (path, path + MANIFEST_SUFFIX):
+            if os.path.exists(name):
+                os.remove(name) # A streamed store would otherwise be resumed
+    stream_jet_ids(paths[0], start, end, data_dir).close()
+    bin_jet_ids_parallel(paths[1], start, end, data_dir, workers=2, chunk=max(1, len(times) // 4)).close()
+    contents = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+    if contents[0] != contents[1]:
+        return 'the parallel store differs from the streamed store'
+    if SourceManifest(paths[0]).files != SourceManifest(paths[1]).files:
+        return 'the parallel store recorded different source files'
+    return None
+
+
+# Build the 500 mb height climatology of the synthetic year and of an earlier year (written with another seed) three ways, all with
+# one year per task so the parts of each range of slots are merged: with 2 workers, with 1 (must be identical) and by accumulating
+# the years in order (the order of the sums differs, so it must only agree to rounding)
+def check_climatology(work_dir, data_dir, times):
+    from synthetic_data import write_ncep_year, steps_in_year
+    from climatology import Climatology, add_year, build_climatology
+    write_ncep_year(data_dir, YEAR - 1, len(times) / float(steps_in_year(YEAR)), variables=('hgt',), seed=1)
+    years = [YEAR - 1, YEAR]
+    parallel = build_climatology(data_dir, years, 'hgt', 500., workers=2, years_per_task=1)
+    serial = build_climatology(data_dir, years, 'hgt', 500., workers=1, years_per_task=1)
+    if not all(np.array_equal(getattr(serial, name), getattr(parallel, name)) for name in ('count', 'mean', 'M2')):
+        return 'the climatology built by 2 workers differs from a serial build'
+    accumulated = Climatology(serial.mean.shape[1:])
+    for year in years:
+        add_year(accumulated, data_dir, year, 'hgt', 500.)
+    if not np.array_equal(accumulated.count, serial.count):
+        return 'the merged climatology has different counts from one accumulated year by year'
+    if not (np.allclose(accumulated.mean, serial.mean, rtol=1e-12, atol=0) and
+            np.allclose(accumulated.M2, serial.M2, rtol=1e-9, atol=1e-6)):
+        return 'the merged climatology differs from one accumulated year by year'
+    return None
+
+
+CHECK_FUNCTIONS = {'jet_store': check_jet_store, 'climatology': check_climatology}
+
+
+# Generate the synthetic data (if needed) and run 'checks'; returns {check: None if it passed, else what went wrong}
+def run_checks(work_dir, scale=0.05, checks=CHECKS, verbose=False):
+    data_dir, times = write_data(work_dir, scale)
+    check_dir = os.path.join(work_dir, 'Verify')
+    if not os.path.exists(check_dir):
+        os.makedirs(check_dir)
+    failures = {}
+    for name in checks:
+        failures[name] = CHECK_FUNCTIONS[name](check_dir, data_dir, times)
+        if verbose:
+            print('%-12s %s' % (name, 'ok' if failures[name] is None else 'FAILED: ' + failures[name]))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the jet ID and map stages on synthetic NCEP/NCAR-shaped data.')
+    parser.add_argument('--scale', type=float, default=0.05, help='fraction of a year of 6-hourly data (default: %(default)s; 1 = 1460 steps)')
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES), help='stages to time (default: all)')
+    parser.add_argument('--repeat', type=int, default=1, help='runs per stage; the fastest is reported (default: %(default)s)')
+    parser.add_argument('--frames', type=int, default=2, help='time steps drawn by the render stage (default: %(default)s)')
+    parser.add_argument('--dpi', type=float, default=72, help='resolution of the rendered figures (default: %(default)s)')
+    parser.add_argument('--compute-steps', dest='compute_all', action='store_false',
+                        help='compute only the rendered time steps instead of every time step')
+    parser.add_argument('--work-dir', help='folder for the synthetic data and figures, kept between runs (default: a temporary folder)')
+    parser.add_argument('--output', help='JSON file to write the results to (default: print them)')
+    parser.add_argument('--verify', action='store_true', help='check results that must not depend on the number of workers instead of timing')
+    args = parser.parse_args(argv)
+    import matplotlib
+    matplotlib.use('Agg') # Figures are only saved
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='ncep_benchmark_')
+    if args.verify:
+        try:
+            failures = run_checks(work_dir, args.scale, verbose=True)
+        finally:
+            if args.work_dir is None:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        sys.exit(1 if any(failure is not None for failure in failures.values()) else 0)
+    try:
+        results = run_benchmark(work_dir, args.scale, args.stages, args.repeat, args.frames, args.dpi, args.compute_all,
+                                verbose=args.output is not None)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print('')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
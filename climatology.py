@@ -0,0 +1,318 @@
+# This module builds climatologies (mean and variance over a range of years) of one variable at one isobaric level from the yearly
+# NCEP/NCAR files (hgt.YYYY.nc, air.YYYY.nc, ...), for every calendar slot: day of the year and 6-hourly time (00Z, 06Z, 12Z, 18Z).
+# Each year is streamed through once, a block of time steps at a time, into running (Welford) accumulators of the count, mean and sum
+# of squared deviations per (slot, lat, lon), so memory stays at the size of the accumulators no matter how many years go in.
+# Calendar slots follow the month and day rather than the time index, so leap years line up: 1 Mar. is the same slot in every year
+# and 29 Feb. has a slot of its own, filled by leap years only.
+# Anomalies for a time step are then the field minus the mean of its slot (or of a window of slots, e.g. a month).
+# Accumulators of disjoint sets of years can be combined exactly (Climatology.merge), so the build is shared out by calendar slots and
+# by years: each task streams one group of years' part of one range of slots (about a month) into its own accumulators, the parts of a
+# range are merged in year order and each finished range is copied into place. Only one range of slots at a time travels back from a
+# worker process, and the work grows with the number of years as well as slots. A finished climatology is saved as a folder of .npy
+# files (plus info.json) that load instantly, memory-mapped, in later runs.
+# ClimatologyStore keeps one such climatology per variable and level and returns anomalies (or standardized anomalies) for any
+# period, reading only the target period's data.
+
+import json
+import multiprocessing
+import os
+from datetime import date, datetime, timedelta
+import numpy as np
+from ncep_reader import NCEPReader, JET_LATS, DEFAULT_BLOCK, HOURS_PER_STEP
+
+SLOTS_PER_DAY = 24 // HOURS_PER_STEP # 00Z, 06Z, 12Z and 18Z
+DAYS_PER_YEAR = 366                  # Slots are laid out on a leap year calendar so 29 Feb. has its own
+NSLOTS = DAYS_PER_YEAR * SLOTS_PER_DAY
+SLOT_YEAR = 2000                     # Any leap year; used to number the days of the slot calendar
+ARRAYS = ('slots', 'count', 'mean', 'M2', 'lat', 'lon') # Arrays saved for a climatology, one .npy file each
+SLOT_CHUNK = 31 * SLOTS_PER_DAY      # Calendar slots built per task by build_climatology (a month)
+YEAR_CHUNK = 5                       # Years built per task by build_climatology
+
+
+# Calendar slot (0 to NSLOTS-1) of a datetime: (day of the leap year calendar) x 4 + 6-hourly time of day
+def calendar_slot(valid_time):
+    day = (date(SLOT_YEAR, valid_time.month, valid_time.day) - date(SLOT_YEAR, 1, 1)).days
+    return day * SLOTS_PER_DAY + valid_time.hour // HOURS_PER_STEP
+
+
+# Slots from datetime 'start' up to (not including) 'end', ignoring the year, e.g. calendar_window(datetime(2010, 10, 1),
+# datetime(2010, 11, 1)) is every 6-hourly slot of October. Windows that run over the end of the year wrap around to 1 Jan.
+def calendar_window(start, end):
+    first = calendar_slot(start)
+    last = calendar_slot(end)
+    if last <= first:
+        last += NSLOTS
+    return np.arange(first, last) % NSLOTS
+
+
+# Running count, mean and sum of squared deviations (M2) per (slot, lat, lon) for the slots in 'slots' (default every slot)
+class Climatology(object):
+
+    def __init__(self, grid_shape, slots=None):
+        self.slots = np.arange(NSLOTS) if slots is None else np.asarray(slots, dtype=np.intp)
+        self.row = np.full(NSLOTS, -1, dtype=np.intp) # Row of the accumulators holding each slot, -1 for slots not kept
+        self.row[self.slots] = np.arange(len(self.slots))
+        self.count = np.zeros(len(self.slots), dtype=np.int64)
+        self.mean = np.zeros((len(self.slots),) + tuple(grid_shape), dtype=np.float64)
+        self.M2 = np.zeros((len(self.slots),) + tuple(grid_shape), dtype=np.float64)
+        self.lat = self.lon = None
+        self.info = {} # What the climatology is of (variable, level, years), saved with it
+
+    # Add one sample for each of 'slots' ((n,) calendar slots; at most one sample per slot per call, as in one year of data) from
+    # 'data' ((n x lat x lon)). Samples for slots that are not kept are left out.
+    def add(self, slots, data):
+        rows = self.row[np.asarray(slots, dtype=np.intp)]
+        keep = rows >= 0
+        rows = rows[keep]
+        data = np.asarray(data, dtype=np.float64)[keep]
+        if len(rows) == 0:
+            return
+        if np.isnan(data).any():
+            raise ValueError('missing values in the data; the climatology needs complete fields')
+        self.count[rows] += 1
+        delta = data - self.mean[rows]
+        self.mean[rows] += delta / self.count[rows][:, np.newaxis, np.newaxis]
+        self.M2[rows] += delta * (data - self.mean[rows])
+
+    # Combine the accumulators of another climatology of the same slots and grid (built from other years) into this one, giving the
+    # same count, mean and M2 as adding all of its samples here
+    def merge(self, other):
+        if not np.array_equal(self.slots, other.slots) or self.mean.shape != other.mean.shape:
+            raise ValueError('climatologies cover different slots or grids')
+        count = self.count + other.count
+        n = np.maximum(count, 1).astype(np.float64)[:, np.newaxis, np.newaxis]
+        na = self.count[:, np.newaxis, np.newaxis]
+        nb = other.count[:, np.newaxis, np.newaxis]
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (nb / n)
+        self.M2 = self.M2 + other.M2 + delta ** 2 * (na * nb / n)
+        self.count = count
+
+    # Save to folder 'dirname' as one .npy file per array plus info.json
+    def save(self, dirname):
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        for name in ARRAYS:
+            if getattr(self, name) is not None:
+                np.save(os.path.join(dirname, name + '.npy'), getattr(self, name))
+        with open(os.path.join(dirname, 'info.json'), 'w') as f:
+            json.dump(self.info, f, sort_keys=True)
+
+    # Load a saved climatology; the arrays are memory-mapped (read-only) unless mmap_mode=None
+    @classmethod
+    def load(cls, dirname, mmap_mode='r'):
+        climatology = cls.__new__(cls)
+        for name in ARRAYS:
+            path = os.path.join(dirname, name + '.npy')
+            setattr(climatology, name, np.load(path, mmap_mode=mmap_mode) if os.path.exists(path) else None)
+        climatology.row = np.full(NSLOTS, -1, dtype=np.intp)
+        climatology.row[climatology.slots] = np.arange(len(climatology.slots))
+        with open(os.path.join(dirname, 'info.json'), 'r') as f:
+            climatology.info = json.load(f)
+        return climatology
+
+    # (slot x lat x lon) variance of the samples (NaN for slots with fewer than two samples); ddof=1 gives the sample variance
+    def variance(self, ddof=0):
+        n = (self.count - ddof).astype(np.float64)[:, np.newaxis, np.newaxis]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(n > 0, self.M2 / n, np.nan)
+
+    # Rows of the accumulators for calendar slots (a datetime or slot number, or several of them) that have samples; slots without any
+    # (e.g. 29 Feb when the years have no leap year) are left out of a window, KeyError if a single slot or every slot has none
+    def _rows(self, slots):
+        slots = np.array([calendar_slot(slot) if isinstance(slot, datetime) else slot for slot in np.atleast_1d(slots)], dtype=np.intp)
+        rows = self.row[slots]
+        kept = (rows >= 0) & (self.count[rows] > 0)
+        if not kept.any():
+            raise KeyError('no climatology for calendar slot(s) %s' % slots.tolist())
+        return rows[kept]
+
+    # Count, mean and M2 of all samples of one or several calendar slots (e.g. a calendar_window) pooled together
+    def stats(self, slots):
+        rows = self._rows(slots)
+        if len(rows) == 1:
+            return self.count[rows[0]], self.mean[rows[0]], self.M2[rows[0]]
+        counts = self.count[rows].astype(np.float64)
+        count = counts.sum()
+        mean = np.tensordot(counts, self.mean[rows], axes=1) / count
+        M2 = self.M2[rows].sum(axis=0) + np.tensordot(counts, (self.mean[rows] - mean) ** 2, axes=1)
+        return count, mean, M2
+
+    # Mean field of one calendar slot (datetime or slot number)
+    def slot_mean(self, slot):
+        return self.stats(slot)[1]
+
+    # Mean field over several slots (e.g. a calendar_window), weighting every sample equally
+    def window_mean(self, slots):
+        return self.stats(slots)[1]
+
+    # Sample variance (ddof=1) of one or several pooled slots; NaN where there are fewer than two samples
+    def slot_variance(self, slots, ddof=1):
+        count, mean, M2 = self.stats(slots)
+        return M2 / (count - ddof) if count > ddof else np.full(mean.shape, np.nan)
+
+    # Anomaly of a field at a datetime from the mean of its calendar slot, or of the slots of 'window' if given.
+    # standardized=True divides by the standard deviation of the same samples (NaN where it is zero or unknown).
+    def anomaly(self, valid_time, field, standardized=False, window=None):
+        count, mean, M2 = self.stats(calendar_slot(valid_time) if window is None else window)
+        anomaly = field - mean
+        if not standardized:
+            return anomaly
+        std = np.sqrt(M2 / (count - 1)) if count > 1 else np.full(mean.shape, np.nan)
+        out = np.full(anomaly.shape, np.nan)
+        np.divide(anomaly, std, out=out, where=std > 0)
+        return out
+
+
+# Stream one year of 'variable' at 'level' (hPa) into a Climatology, 'block' time steps at a time
+def add_year(climatology, data_dir, year, variable, level, lats=JET_LATS, block=DEFAULT_BLOCK):
+    reader = NCEPReader(data_dir, year, (variable,), levels=(level,), lats=lats)
+    try:
+        slots = np.array([calendar_slot(reader.valid_time(t)) for t in range(reader.ntime)])
+        times = np.flatnonzero(climatology.row[slots] >= 0) # Only read the parts of the year the climatology keeps
+        for run in np.split(times, np.flatnonzero(np.diff(times) != 1) + 1): # e.g. the end and start of a window over New Year
+            if len(run) == 0:
+                continue
+            t0 = run[0]
+            while t0 <= run[-1]:
+                t1 = min(run[-1] + 1, t0 + block)
+                data = reader.read_block(t0, t1)[variable][:, 0]
+                climatology.add(slots[t0:t1], data)
+                t0 = t1
+    finally:
+        reader.close()
+
+
+# Climatology of 'variable' at 'level' (hPa) over 'years' (e.g. range(1981, 2011) for 1981-2010), reading each time step once.
+# 'window' limits it to a set of calendar slots (see calendar_window), which also limits what is read from each file.
+# The slots are split into ranges of at most SLOT_CHUNK and the years into groups of 'years_per_task'; each (range, group) task is run
+# by one of 'workers' processes (default one per CPU), which streams that group's part of the range into accumulators of that range
+# only. The parent merges the groups of each range in year order, whatever order they finish in, so the result is the same for any
+# number of workers.
+def build_climatology(data_dir, years, variable, level, lats=JET_LATS, window=None, block=DEFAULT_BLOCK, workers=None,
+                      years_per_task=YEAR_CHUNK):
+    years = list(years)
+    if not years:
+        raise ValueError('no years to build a climatology from')
+    reader = NCEPReader(data_dir, years[0], (variable,), levels=(level,), lats=lats)
+    climatology = Climatology((len(reader.lat), len(reader.lon)), window)
+    climatology.lat = np.asarray(reader.lat)
+    climatology.lon = np.asarray(reader.lon)
+    reader.close()
+    workers = workers or multiprocessing.cpu_count()
+    groups = [years[i:i + years_per_task] for i in range(0, len(years), years_per_task)]
+    chunk = max(1, min(SLOT_CHUNK, -(-len(climatology.slots) * len(groups) // workers)))
+    ranges = [climatology.slots[i:i + chunk] for i in range(0, len(climatology.slots), chunk)]
+    args = [(n, data_dir, group, variable, level, lats, slots, block)
+            for n, (slots, group) in enumerate((slots, group) for slots in ranges for group in groups)]
+    workers = min(workers, len(args))
+    if workers <= 1:
+        _fill_parts(climatology, map(_build_part, args), len(groups))
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            _fill_parts(climatology, pool.imap_unordered(_build_part, args), len(groups))
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    climatology.info = {'variable': variable, 'level': float(level), 'years': years, 'lats': [lats.start, lats.stop, lats.step]}
+    return climatology
+
+
+# Merge the parts (task number, accumulators) of each range of slots in the order of their 'ngroups' year groups, holding any that
+# finish early, and copy each range into 'climatology' once all its groups are in
+def _fill_parts(climatology, parts, ngroups):
+    merged = {}  # Range of slots -> (accumulators of its first groups, number of groups merged)
+    waiting = {} # Task number -> part finished before a group ahead of it in the same range
+    for n, part in parts:
+        waiting[n] = part
+        index = n // ngroups
+        done, count = merged.pop(index, (None, 0))
+        while index * ngroups + count in waiting:
+            part = waiting.pop(index * ngroups + count)
+            if done is None:
+                done = part
+            else:
+                done.merge(part)
+            count += 1
+        if count < ngroups:
+            merged[index] = (done, count)
+            continue
+        rows = climatology.row[done.slots]
+        climatology.count[rows] = done.count
+        climatology.mean[rows] = done.mean
+        climatology.M2[rows] = done.M2
+
+
+# Stream a group of years' part of a range of calendar slots into one Climatology (run in a worker process by build_climatology)
+def _build_part(args):
+    n, data_dir, years, variable, level, lats, slots, block = args
+    reader = NCEPReader(data_dir, years[0], (variable,), levels=(level,), lats=lats)
+    climatology = Climatology((len(reader.lat), len(reader.lon)), slots)
+    reader.close()
+    for year in years:
+        add_year(climatology, data_dir, year, variable, level, lats, block)
+    return n, climatology
+
+
+# Folder of saved climatologies, one per variable and level (e.g. <store_dir>/hgt500), all over every calendar slot, with anomalies
+# for any period computed from them and the target period's own files in 'data_dir' only. The climatologies are memory-mapped, so an
+# anomaly map reads just the slots it uses from them.
+class ClimatologyStore(object):
+
+    def __init__(self, store_dir, data_dir):
+        self.store_dir = store_dir
+        self.data_dir = data_dir
+        self._loaded = {}
+
+    def path(self, variable, level):
+        return os.path.join(self.store_dir, '%s%g' % (variable, level))
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self.path(*key), 'info.json'))
+
+    # The climatology of a variable and level (KeyError if it has not been built)
+    def get(self, variable, level):
+        key = (variable, float(level))
+        if key not in self._loaded:
+            if key not in self:
+                raise KeyError('no climatology of %s at %g hPa in %s; build it first' % (variable, level, self.store_dir))
+            self._loaded[key] = Climatology.load(self.path(*key))
+        return self._loaded[key]
+
+    # Build (or rebuild) the climatology of a variable and level over 'years' from the files in data_dir and save it
+    def build(self, variable, level, years, lats=slice(None), workers=None, block=DEFAULT_BLOCK):
+        climatology = build_climatology(self.data_dir, years, variable, level, lats, block=block, workers=workers)
+        climatology.save(self.path(variable, level))
+        self._loaded.pop((variable, float(level)), None)
+        return self.get(variable, level)
+
+    # Loop over the 6-hourly times from datetime 'start' up to (not including) 'end', yielding (datetime, anomaly) with the anomaly of
+    # 'variable' at 'level' from its climatology (per calendar slot, or from the pooled slots of 'window'); see Climatology.anomaly.
+    # Only the target times are read from data_dir.
+    def iter_anomalies(self, variable, level, start, end, standardized=False, window=None, block=DEFAULT_BLOCK):
+        climatology = self.get(variable, level)
+        lats = slice(*climatology.info['lats'])
+        last = end - timedelta(hours=HOURS_PER_STEP)
+        for year in range(start.year, last.year + 1):
+            reader = NCEPReader(self.data_dir, year, (variable,), levels=(level,), lats=lats)
+            try:
+                t0 = max(0, reader.time_index(start)) if start.year == year else 0
+                t1 = min(reader.ntime, reader.time_index(end)) if end.year == year else reader.ntime
+                for t, fields in reader.iter_steps(t0, t1, block=block):
+                    valid_time = reader.valid_time(t)
+                    yield valid_time, climatology.anomaly(valid_time, fields[variable][0], standardized, window)
+            finally:
+                reader.close()
+
+    # Same as iter_anomalies, as a list of datetimes and a (time x lat x lon) array
+    def anomalies(self, variable, level, start, end, standardized=False, window=None, block=DEFAULT_BLOCK):
+        times = []
+        fields = []
+        for valid_time, anomaly in self.iter_anomalies(variable, level, start, end, standardized, window, block):
+            times.append(valid_time)
+            fields.append(anomaly)
+        return times, np.array(fields)
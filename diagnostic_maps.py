@@ -0,0 +1,35 @@
+# This script makes the baroclinic instability, Brunt-Vaisala frequency, shear and triplot maps for the same period in one pass over
+# the data: every time step is read once from the .2010.nc files and the fields the products share are computed once
+# (see diagnostics_pipeline.py), instead of running baroclinic_instability_map.py, brunt_vaisala.py, shear_map.py and
+# triplot_baroclinic.py one after another.
+# NC Files Can be Obtained From: ftp://ftp.cdc.noaa.gov/Datasets/ncep.reanalysis/
+
+import os
+from diagnostics_pipeline import run_products
+from instrument import start_run
+
+# Frames are drawn by worker processes when workers > 1, which import this script again when they start on Windows and macOS;
+# everything below only runs when the script itself is run.
+if __name__ == '__main__':
+    # Record the time, CPU, bytes read and memory of each stage when NCEP_RUN_REPORT is set (and a cProfile dump with NCEP_RUN_PROFILE)
+    start_run('diagnostic_maps')
+
+    # Create our data folder if we need to.
+    currentFilePath = os.path.realpath(__file__)
+    currentDir = os.path.dirname(currentFilePath)
+    trgDir = currentDir + '/Data/'
+    if not os.path.exists(trgDir):
+        os.makedirs(trgDir)
+    saveDir = currentDir + '/Figures/'
+    if not os.path.exists(saveDir):
+        os.makedirs(saveDir)
+    cacheDir = currentDir + '/Cache/' # Derived fields are kept here between runs (see field_cache.py); None reads and computes every time
+
+    startingTimeIndex=1184
+    endingTimeIndex=1208
+    workers=1 # Processes drawing the frames (e.g. the number of CPU cores); frames are the same for any number
+    products=['bi','brunt_vaisala','shear','triplot'] # Any of the keys of map_products.PRODUCTS
+    animation=None # None saves one figure per time step; 'auto' (MP4 with ffmpeg, else GIF), 'mp4', 'gif' or 'png' writes one animation per product
+    dpi=None       # None keeps each product's resolution; e.g. 72 (animation.PREVIEW_DPI) for a quick preview
+
+    run_products(trgDir,2010,startingTimeIndex,endingTimeIndex,products,saveDir,cache_dir=cacheDir,workers=workers,animation=animation,dpi=dpi)
@@ -0,0 +1,237 @@
+# This module makes any set of the diagnostic map products (see map_products.py) for a range of time steps in one pass.
+# The NCEP/NCAR files are opened once with the union of the variables and levels the products need, every time step is read once,
+# and the fields shared between products (wind speed, potential temperature, thickness, BI/N/shear for a set of levels) are computed
+# once per time step and handed to each product's renderer. Running e.g. the BI map, Brunt-Vaisala map, shear map and triplot together
+# costs one read and one compute pass plus the plotting, instead of four of each.
+# Each product's frames can also go into one animation file instead of one figure per time step (animation.py).
+# Re-running a period only draws the figures that are missing or whose inputs changed since they were drawn (frame_manifest.py).
+# Derived fields can also be kept on disk between runs (field_cache.py), so re-plotting a period reads and computes nothing.
+
+import multiprocessing
+from collections import deque
+from datetime import datetime
+from functools import partial
+from baroclinic import wind_speed, potential_temperature, thickness, shear_from_speed, brunt_vaisala_from_theta, baroclinic_instability
+from ncep_reader import NCEPReader, StepReader, PrefetchingStepReader, DEFAULT_BLOCK
+from field_cache import FieldCache, source_identity, DEFAULT_MAX_BYTES
+from animation import open_animation, DEFAULT_FPS
+from frame_manifest import FrameManifest, fingerprint
+from instrument import span
+
+MAX_PENDING = 4 # Frames queued per rendering process before the reading/computing waits for them
+
+
+# Derived fields of one time step, each computed the first time it is asked for and kept for the other products of the same step.
+# 'fields' is {variable: (level x lat x lon) array} as yielded by NCEPReader.iter_steps (or a StepFields, which reads them only when
+# first used), 'p_levels' the level vector of the arrays and 'lat' the latitude of each row.
+# With a field_cache.FieldCache, fields are also looked up on disk before being computed, keyed by 'key' (what identifies the time step:
+# time index, latitude selection, ...) plus the field's name, parameters and the identity of the source files of the variables it uses
+# ('sources', {variable: field_cache.source_identity}). A field found in the cache needs neither the data read nor the computation.
+class DerivedFields(object):
+
+    def __init__(self, fields, p_levels, lat, cache=None, key=(), sources=None):
+        self.fields = fields
+        self.p_levels = p_levels
+        self.lat = lat
+        self.cache = cache
+        self.key = tuple(key)
+        self.sources = sources or {}
+        self._cache = {}
+
+    # Field 'key' (name and parameters) computed from 'variables' by compute()
+    def _get(self, key, variables, compute):
+        if key not in self._cache:
+            if self.cache is None:
+                self._cache[key] = compute()
+            else:
+                cache_key = key + self.key + tuple(self.sources.get(name) for name in variables)
+                self._cache[key] = self.cache.get_or_compute(cache_key, compute)
+        return self._cache[key]
+
+    # Wind speed at every level read
+    def wind_speed(self):
+        return self._get(('wind_speed', tuple(float(p) for p in self.p_levels)), ('uwnd', 'vwnd'),
+                         lambda: wind_speed(self.fields['uwnd'], self.fields['vwnd']))
+
+    # Potential temperature at every level read
+    def potential_temperature(self):
+        return self._get(('potential_temperature', tuple(float(p) for p in self.p_levels)), ('air',),
+                         lambda: potential_temperature(self.fields['air'], self.p_levels))
+
+    def thickness(self, low, high):
+        return self._get(('thickness', low, high), ('hgt',), lambda: thickness(self.fields['hgt'], self.p_levels, low, high))
+
+    # Shear term, Brunt-Vaisala frequency and baroclinic instability (s^-1) for the given levels (see baroclinic.py)
+    def shear(self, low, high):
+        return self._get(('shear', low, high), ('uwnd', 'vwnd', 'hgt'),
+                         lambda: shear_from_speed(self.wind_speed(), self.fields['hgt'], self.p_levels, low, high))
+
+    def brunt_vaisala(self, low, mid, high):
+        return self._get(('brunt_vaisala', low, mid, high), ('air', 'hgt'),
+                         lambda: brunt_vaisala_from_theta(self.potential_temperature(), self.fields['hgt'], self.p_levels, low, mid, high))
+
+    def baroclinic_instability(self, low, mid, high):
+        return self._get(('baroclinic_instability', low, mid, high), ('air', 'uwnd', 'vwnd', 'hgt'),
+                         lambda: baroclinic_instability(self.brunt_vaisala(low, mid, high), self.shear(low, high), self.lat))
+
+
+# {variable: array} of one time step that reads the data (through an ncep_reader.StepReader) only when a variable is first used
+class StepFields(object):
+
+    def __init__(self, steps, t):
+        self.steps = steps
+        self.t = t
+        self.data = None
+
+    def __getitem__(self, name):
+        if self.data is None:
+            self.data = self.steps.step(self.t)
+        return self.data[name]
+
+
+# Draws frames with function(*args), in this process or, with workers > 1, in the next free process of a pool. initializer(*initargs)
+# sets up drawing in this process and in every worker (e.g. map_products.init_renderer). Results are handed to done(result) in the
+# order the frames were drawn; at most MAX_PENDING frames per worker wait to be drawn, so the fields queued for them stay bounded.
+class FramePool(object):
+
+    def __init__(self, workers, initializer, initargs=()):
+        initializer(*initargs)
+        self.workers = workers
+        self.pool = None if workers <= 1 else multiprocessing.Pool(workers, initializer=initializer, initargs=initargs)
+        self.pending = deque()
+
+    # Draw one frame; done (None to ignore the result) is called once it is drawn
+    def draw(self, done, function, *args):
+        if self.pool is None:
+            with span('render'):
+                result = function(*args)
+            if done is not None:
+                done(result)
+            return
+        self.pending.append((done, self.pool.apply_async(function, args)))
+        while len(self.pending) > MAX_PENDING * self.workers:
+            self._wait()
+
+    # Wait for the oldest frame and hand over its result
+    def _wait(self):
+        done, result = self.pending.popleft()
+        with span('render_wait'):
+            result = result.get() # Also raises any error from the worker
+        if done is not None:
+            done(result)
+
+    # Wait for every frame and stop the workers
+    def finish(self):
+        while self.pending:
+            self._wait()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+    # Stop the workers without waiting for the frames (after an error)
+    def terminate(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+
+
+# Variables and levels needed by a list of products, in file order (variables) and top-down order (levels)
+def product_requirements(products):
+    variables = []
+    levels = set()
+    for product in products:
+        variables += [name for name in product.variables if name not in variables]
+        levels.update(product.levels)
+    return tuple(variables), tuple(sorted(levels, reverse=True))
+
+
+# Make every product in 'names' (keys of map_products.PRODUCTS, e.g. ['bi', 'brunt_vaisala', 'shear', 'triplot']) for time steps
+# [start, end) of 'year'. start/end are time indices into the year's files, or datetimes. Figures are saved to save_dir.
+# With a cache_dir, derived fields are kept there between runs (see field_cache.py): steps whose fields are all cached are plotted
+# without reading the NetCDF files. Pickled Basemaps are kept there too (see map_render.py).
+# With workers > 1 the frames are drawn by that many processes: this process reads the data and computes the fields, and hands each
+# frame's fields to the next free worker, which keeps its own open figures between frames. Every frame is drawn by the same code from
+# the same fields either way, so the files are the same as in a serial run.
+# With prefetch > 0 a background thread reads that many blocks ahead (ncep_reader.PrefetchingStepReader) while the current time steps
+# are computed and plotted. It reads every block, so with a warm field cache the default (0, read only what is needed) is better.
+# With a region (lat_min, lat_max, lon_min, lon_max), only the grid boxes inside it are read and computed (see ncep_reader.py), e.g.
+# ncep_reader.MERCATOR_REGION for the products drawn on the 120E-300E Mercator map; the default is the jet latitudes all around.
+# With an animation format ('auto', 'mp4', 'gif' or 'png'; see animation.open_animation), each product's frames are written in time
+# order into one file in save_dir, e.g. bi_2010100100-2010103118.mp4, and no per-frame figures are saved. dpi sets the resolution of
+# the frames or figures (e.g. animation.PREVIEW_DPI for a quick look) instead of each product's own, and fps the animation speed.
+# Figures (not animations) that exist and were drawn from the same inputs by an earlier run are skipped, along with the reading and
+# computing they need: the inputs of each figure (source files, time index, product, dpi, region; see frame_manifest.py) are recorded
+# in save_dir. force=True draws every figure again.
+# Returns the number of time steps processed.
+def run_products(data_dir, year, start, end, names, save_dir, block=DEFAULT_BLOCK, cache_dir=None, max_cache_bytes=DEFAULT_MAX_BYTES,
+                 workers=1, prefetch=0, region=None, animation=None, dpi=None, fps=DEFAULT_FPS, force=False):
+    # Imported here so the pipeline can be used without loading matplotlib/Basemap until needed
+    from map_products import PRODUCTS, FIGURE_VERSION, init_renderer, close_figures, render_frame, figure_path
+    unknown = [name for name in names if name not in PRODUCTS]
+    if unknown:
+        raise ValueError('unknown product(s) %s; choose from %s' % (', '.join(unknown), ', '.join(sorted(PRODUCTS))))
+    products = [PRODUCTS[name] for name in names]
+    variables, levels = product_requirements(products)
+    reader = NCEPReader(data_dir, year, variables, levels=levels, region=region)
+    cache = None if cache_dir is None else FieldCache(cache_dir, max_cache_bytes)
+    frames = FramePool(workers, init_renderer, (cache_dir, animation is not None, dpi))
+    steps = None
+    writers = {} # Animation of each product
+    manifest = FrameManifest(save_dir) if animation is None else None
+
+    # Add a drawn frame of product 'name' to its animation, or record the inputs of the figure it saved to 'path'
+    def finish(name, path, inputs, frame):
+        if name in writers:
+            with span('animation_write'):
+                writers[name].add(frame)
+        elif manifest is not None:
+            manifest.record(path, inputs)
+
+    try:
+        if isinstance(start, datetime):
+            start = reader.time_index(start)
+        if isinstance(end, datetime):
+            end = reader.time_index(end)
+        if animation is not None and end > start:
+            period = '%s-%s' % (reader.valid_time(start).strftime('%Y%m%d%H'), reader.valid_time(end - 1).strftime('%Y%m%d%H'))
+            for name in names:
+                writers[name] = open_animation(save_dir + name + '_' + period, animation, fps)
+        sources = dict((name, source_identity(path)) for name, path in reader.paths.items())
+        if prefetch > 0:
+            steps = PrefetchingStepReader(reader, start, end, block=block, depth=prefetch)
+        else:
+            steps = StepReader(reader, end, block=block)
+        for t in range(start, end):
+            derived = DerivedFields(StepFields(steps, t), reader.level, reader.lat, cache, (t, reader.selection_key()), sources)
+            valid_time = reader.valid_time(t)
+            for name, product in zip(names, products):
+                path = inputs = None
+                if manifest is not None:
+                    path = figure_path(name, t, valid_time, save_dir)
+                    inputs = fingerprint((FIGURE_VERSION, name, product.variables, product.levels, sorted(product.style.items()), dpi,
+                                          reader.selection_key(), t, tuple(sources[variable] for variable in product.variables)))
+                    if not force and manifest.up_to_date(path, inputs):
+                        continue
+                with span('compute'): # Includes reading the time step (netcdf_read) and cache lookups
+                    fields = product.fields(derived)
+                frames.draw(partial(finish, name, path, inputs), render_frame, name, fields, reader.lat, reader.lon, t, valid_time,
+                            save_dir)
+        frames.finish()
+        for writer in writers.values():
+            writer.close()
+        return max(0, end - start)
+    except BaseException:
+        frames.terminate()
+        raise
+    finally:
+        for writer in writers.values():
+            writer.abort() # Only does anything if the run stopped before the writer was closed, e.g. stops ffmpeg
+        if isinstance(steps, PrefetchingStepReader):
+            steps.close()
+        reader.close()
+        close_figures()
+        init_renderer(None)
+        if cache is not None:
+            cache.save()
+        if manifest is not None:
+            manifest.save()
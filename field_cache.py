@@ -0,0 +1,126 @@
+# This module keeps derived fields (wind speed, potential temperature, thickness, BI/N/shear, ...) on disk between runs, so re-making
+# figures after a change to the plotting only (colormap, contour levels, titles) does not read the NetCDF files or redo the math again.
+# Every field is stored as a .npy file named after a hash of its key: the identity (path, size, mtime) of every source file it was
+# computed from, the field name and its parameters (levels, latitude selection) and the time index. Rewriting or replacing a source
+# file changes its identity, so stale fields are never returned; they simply stop being used and age out.
+# The cache has a size cap: when a new field would take it over the cap, the least recently used fields are deleted first.
+
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from atomic_file import replacing
+from instrument import span
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3 # 2 GB
+INDEX_NAME = 'index.json'         # {entry name: [bytes, last used (seconds since the epoch)]}
+INDEX_VERSION = 1
+
+
+# (path, size, mtime) of a source file
+def source_identity(path):
+    st = os.stat(path)
+    return (os.path.realpath(path), st.st_size, st.st_mtime)
+
+
+# Size-capped, least recently used cache of NumPy arrays in 'cache_dir'
+class FieldCache(object):
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(cache_dir, INDEX_NAME)
+        self.hits = 0
+        self.misses = 0
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.entries = self._load()
+
+    # Read the index, and add any .npy files it does not know about (e.g. from a run that stopped before saving it)
+    def _load(self):
+        entries = {}
+        try:
+            with open(self.index_file, 'r') as f:
+                index = json.load(f)
+            if index.get('version') == INDEX_VERSION:
+                entries = index['entries']
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        on_disk = set(name for name in os.listdir(self.cache_dir) if name.endswith('.npy'))
+        entries = dict((name, entry) for name, entry in entries.items() if name in on_disk)
+        for name in on_disk - set(entries):
+            st = os.stat(os.path.join(self.cache_dir, name))
+            entries[name] = [st.st_size, st.st_mtime]
+        return entries
+
+    # Write the index (to a temporary file first, so an interrupted save never leaves a half written index)
+    def save(self):
+        with replacing(self.index_file) as tmp, open(tmp, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'entries': self.entries}, f)
+
+    # Name of the file holding the field for a key; the key is any tuple of strings, numbers and nested tuples
+    @staticmethod
+    def entry_name(key):
+        return hashlib.sha1(repr(key).encode('utf-8')).hexdigest() + '.npy'
+
+    def __contains__(self, key):
+        return self.entry_name(key) in self.entries
+
+    # The cached array for a key, or None
+    def get(self, key):
+        name = self.entry_name(key)
+        if name not in self.entries:
+            self.misses += 1
+            return None
+        try:
+            with span('cache_read'):
+                data = np.load(os.path.join(self.cache_dir, name))
+        except (IOError, OSError, ValueError): # Deleted or cut short behind our back
+            self.entries.pop(name, None)
+            self.misses += 1
+            return None
+        self.entries[name][1] = time.time()
+        self.hits += 1
+        return data
+
+    # Store an array under a key, making room first if the cache would go over its size cap
+    def put(self, key, data):
+        name = self.entry_name(key)
+        path = os.path.join(self.cache_dir, name)
+        data = np.asarray(data)
+        self._evict(self.max_bytes - data.nbytes, keep=name)
+        with span('cache_write'), replacing(path) as tmp, open(tmp, 'wb') as f:
+            np.save(f, data)
+        self.entries[name] = [os.path.getsize(path), time.time()]
+
+    # The cached array for a key, computing and storing it with compute(*args) on a miss
+    def get_or_compute(self, key, compute, *args):
+        data = self.get(key)
+        if data is None:
+            data = compute(*args)
+            self.put(key, data)
+        return data
+
+    # Total bytes of the cached fields
+    def size(self):
+        return sum(entry[0] for entry in self.entries.values())
+
+    # Delete least recently used fields until the cache holds at most 'limit' bytes
+    def _evict(self, limit, keep=None):
+        total = self.size()
+        for name in sorted(self.entries, key=lambda name: self.entries[name][1]):
+            if total <= limit:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+            total -= self.entries.pop(name)[0]
+
+    # Delete every cached field
+    def clear(self):
+        self._evict(-1)
+        self.save()
@@ -0,0 +1,57 @@
+# This module lets a batch of figures be re-run like 'make': only the frames whose inputs changed, or whose file is missing, are drawn
+# again. For every figure it draws, the pipeline records a fingerprint of everything the figure depends on (identity of the source files,
+# time index, product levels and style, resolution, region, figure code version) in a manifest in the figure folder. On the next run a
+# frame is up to date when its file exists and its recorded fingerprint is the one the run would use. A run that stopped halfway (or
+# crashed) only redraws the frames it had not finished: a frame is recorded once its file is written, and the manifest is saved every
+# SAVE_EVERY frames as well as at the end of the run.
+
+import hashlib
+import json
+import os
+from atomic_file import replacing
+
+MANIFEST_NAME = '.frames.json' # {figure file name: fingerprint}
+MANIFEST_VERSION = 1
+SAVE_EVERY = 20
+
+
+# Fingerprint of a figure's inputs; 'parts' is a tuple of strings, numbers and nested tuples
+def fingerprint(parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+# The fingerprints of the figures in 'save_dir'
+class FrameManifest(object):
+
+    def __init__(self, save_dir):
+        self.save_dir = save_dir
+        self.path = os.path.join(save_dir, MANIFEST_NAME)
+        self.frames = self._load()
+        self.unsaved = 0
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION:
+                return manifest['frames']
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        return {}
+
+    # Write the manifest (to a temporary file first, so an interrupted save never leaves a half written manifest)
+    def save(self):
+        with replacing(self.path) as tmp, open(tmp, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'frames': self.frames}, f)
+        self.unsaved = 0
+
+    # True if the figure at 'path' exists and was drawn from inputs with this fingerprint
+    def up_to_date(self, path, fingerprint):
+        return self.frames.get(os.path.basename(path)) == fingerprint and os.path.exists(path)
+
+    # Record that the figure at 'path' was drawn from inputs with this fingerprint
+    def record(self, path, fingerprint):
+        self.frames[os.path.basename(path)] = fingerprint
+        self.unsaved += 1
+        if self.unsaved >= SAVE_EVERY:
+            self.save()
@@ -0,0 +1,274 @@
+# This module records where the time of a run goes. The stages of the binning and map code are wrapped in named spans:
+#   with span('netcdf_read'):
+#       ...
+# and while a run is being recorded (start_run), every span adds its wall time, CPU time, bytes read from files and the peak resident
+# memory reached while it was open to the totals for its name. Spans inside other spans are recorded under both names joined by '/' (e.g.
+# 'compute/netcdf_read'), so the report shows where each stage's time went. When no run is being recorded, span() returns a shared
+# do-nothing context manager, so instrumented code costs one function call per span.
+# At the end of the run (or of the process) a report is written as JSON or CSV (by the file extension), with one row per span name, and
+# optionally a cProfile dump of the whole run (view it with 'python -m pstats <file>' or snakeviz).
+# Scripts can also be recorded without editing them by setting NCEP_RUN_REPORT (and NCEP_RUN_PROFILE) to the files to write.
+# Only the process that started the run is recorded; frames drawn by worker processes show up as the time spent waiting for them.
+# Bytes read come from /proc/self/io (Linux; all reads through the operating system, including ones served from the page cache) or
+# the block input count of getrusage elsewhere. The peak memory of a span comes from resetting the process's peak resident set size
+# when the span starts (/proc/self/clear_refs) and reading it (VmHWM in /proc/self/status) when it ends, so it is the span's own peak;
+# where that is not possible (not Linux) it is None. Every row also has the peak of the whole process so far (process_peak_rss_bytes);
+# resetting the peak also resets the one getrusage reports, so while a run is recorded the run keeps track of it.
+
+import atexit
+import cProfile
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+REPORT_ENV = 'NCEP_RUN_REPORT'
+PROFILE_ENV = 'NCEP_RUN_PROFILE'
+REPORT_VERSION = 2
+FIELDS = ('name', 'calls', 'wall_seconds', 'cpu_seconds', 'bytes_read', 'peak_rss_bytes', 'process_peak_rss_bytes')
+
+_run = None # The run being recorded, or None
+_proc_files = {} # Open /proc/self files of this process: {(pid, name): file descriptor, or None where there is none}
+
+
+# File descriptor of /proc/self/<name> opened once per process (a forked process has its own counters), or None
+def _proc_file(name, flags=os.O_RDONLY):
+    key = (os.getpid(), name)
+    if key not in _proc_files:
+        try:
+            _proc_files[key] = os.open('/proc/self/' + name, flags)
+        except OSError:
+            _proc_files[key] = None
+    return _proc_files[key]
+
+
+# Value of the counter 'field' (e.g. b'rchar:') in the /proc/self file open on fd, or None
+def _proc_counter(fd, field):
+    if fd is None or not hasattr(os, 'pread'):
+        return None
+    try:
+        text = os.pread(fd, 4096, 0) # Re-reading from the start gives the current counters
+        start = text.index(field) + len(field)
+        return int(text[start:text.index(b'\n', start)].split()[0])
+    except (OSError, ValueError):
+        return None
+
+
+# Bytes the process has read so far, or None
+def bytes_read():
+    read = _proc_counter(_proc_file('io'), b'rchar:')
+    if read is not None:
+        return read
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_inblock * 512
+    return None
+
+
+# Peak resident set size (bytes) since the last reset_rss_peak(), or None where it cannot be reset
+def rss_peak():
+    if _proc_file('clear_refs', os.O_WRONLY) is None:
+        return None
+    peak = _proc_counter(_proc_file('status'), b'VmHWM:')
+    return None if peak is None else peak * 1024 # kB
+
+
+# Start measuring the peak resident set size from the current size (Linux)
+def reset_rss_peak():
+    fd = _proc_file('clear_refs', os.O_WRONLY)
+    if fd is not None:
+        try:
+            os.write(fd, b'5')
+        except OSError:
+            pass
+
+
+# Largest resident set size of the process so far (bytes), or None
+def peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # kilobytes except on macOS
+
+
+class _NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+# One timed stage; totals are added to the run when it ends
+class _Span(object):
+
+    def __init__(self, run, name):
+        self.run = run
+        self.name = name
+        self.peak = None
+
+    def __enter__(self):
+        stack = self.run.stack()
+        self.path = '/'.join(stack + [self.name])
+        stack.append(self.name)
+        self.run.open_span(self)
+        self.read = bytes_read()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu # CPU time of the whole process, so it includes other threads (e.g. a prefetching reader)
+        read = bytes_read()
+        read = None if read is None or self.read is None else read - self.read
+        self.run.stack().pop()
+        self.run.close_span(self)
+        self.run.add(self.path, wall, cpu, read, self.peak, self.run.process_peak)
+        return False
+
+
+# Totals of every span name over a run
+class Run(object):
+
+    def __init__(self, name, report=None, profile=None):
+        self.name = name
+        self.report_path = report
+        self.profile_path = profile
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.open = set() # Spans open in any thread
+        self.process_peak = peak_rss()
+        self.pid = os.getpid()
+        self.started = datetime.now()
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        self.read = bytes_read()
+        self.profiler = None
+        if profile is not None:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    # Names of the spans open in the current thread
+    def stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    # Fold the peak resident set size since the last reset into every open span and the peak of the process
+    def _note_peak(self):
+        peak = rss_peak()
+        if peak is None: # Nothing is reset, so getrusage still has the peak of the process
+            self.process_peak = peak_rss()
+            return
+        self.process_peak = max(self.process_peak or 0, peak)
+        for span in self.open:
+            span.peak = max(span.peak or 0, peak)
+
+    # The peak is reset when a span starts, after the spans already open (e.g. the one it is nested in) have taken the peak so far
+    def open_span(self, span):
+        with self.lock:
+            if self.open:
+                self._note_peak()
+            self.open.add(span)
+            reset_rss_peak()
+
+    def close_span(self, span):
+        with self.lock:
+            self._note_peak()
+            self.open.discard(span)
+
+    def add(self, path, wall, cpu, read, rss, process_rss):
+        with self.lock:
+            total = self.totals.get(path)
+            if total is None:
+                total = self.totals[path] = {'name': path, 'calls': 0, 'wall_seconds': 0., 'cpu_seconds': 0., 'bytes_read': None,
+                                             'peak_rss_bytes': None, 'process_peak_rss_bytes': None}
+            total['calls'] += 1
+            total['wall_seconds'] += wall
+            total['cpu_seconds'] += cpu
+            if read is not None:
+                total['bytes_read'] = (total['bytes_read'] or 0) + read
+            if rss is not None:
+                total['peak_rss_bytes'] = max(total['peak_rss_bytes'] or 0, rss)
+            if process_rss is not None:
+                total['process_peak_rss_bytes'] = max(total['process_peak_rss_bytes'] or 0, process_rss)
+
+    # The report as a dict: totals of the whole run and of every span name, in the order the names were first seen
+    def report(self):
+        read = bytes_read()
+        with self.lock:
+            self._note_peak()
+        return {'version': REPORT_VERSION, 'run': self.name, 'started': self.started.isoformat(),
+                'wall_seconds': time.perf_counter() - self.wall, 'cpu_seconds': time.process_time() - self.cpu,
+                'bytes_read': None if read is None or self.read is None else read - self.read, 'peak_rss_bytes': self.process_peak,
+                'process_peak_rss_bytes': self.process_peak,
+                'spans': list(self.totals.values())}
+
+    # Stop profiling and write the report and profile (if any were asked for); returns the report
+    def finish(self):
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_path)
+            self.profiler = None
+        report = self.report()
+        if self.report_path is not None:
+            write_report(report, self.report_path)
+        return report
+
+
+# Write a report as CSV (one row per span, then one for the whole run) if the path ends in .csv, else as JSON
+def write_report(report, path):
+    if path.lower().endswith('.csv'):
+        with open(path, 'w') as f:
+            writer = csv.DictWriter(f, FIELDS, extrasaction='ignore', lineterminator='\n')
+            writer.writeheader()
+            for row in report['spans']:
+                writer.writerow(row)
+            writer.writerow(dict(report, name=report['run'], calls=1))
+    else:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+# Context manager timing the stage 'name' while a run is being recorded
+def span(name):
+    if _run is None or _run.pid != os.getpid(): # Forked worker processes inherit the run but are not recorded
+        return _NULL_SPAN
+    return _Span(_run, name)
+
+
+# Start recording a run called 'name'. Its report is written to 'report' (.json or .csv) and a cProfile dump to 'profile' when the run
+# is finished with finish_run(), or when the process exits. Without a report or profile file, the NCEP_RUN_REPORT/NCEP_RUN_PROFILE
+# environment variables are used, and if neither is set nothing is recorded (returns None).
+def start_run(name, report=None, profile=None):
+    global _run
+    if report is None and profile is None:
+        report = os.environ.get(REPORT_ENV) or None
+        profile = os.environ.get(PROFILE_ENV) or None
+        if report is None and profile is None:
+            return None
+    finish_run()
+    _run = Run(name, report, profile)
+    return _run
+
+
+# Finish the run being recorded (see Run.finish); returns its report, or None if no run was being recorded
+def finish_run():
+    global _run
+    run, _run = _run, None
+    return None if run is None else run.finish()
+
+
+atexit.register(finish_run)
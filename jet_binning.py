@@ -0,0 +1,107 @@
+# This module grids jet ID points onto the NCEP/NCAR Reanalysis 1 2.5 deg grid used by the binning scripts.
+# Instead of comparing every point against the full lat and lon vectors (lat==lat_pts[i], lon==lon_pts[i]) the grid indices are
+# computed directly from the known grid spacing, and all points of a file are written into the (lat, lon, day, hr) array at once.
+# bin_jet_classes walks the calendar once and grids the polar, subtropical and superposition ID's of every time step together.
+
+import os
+import warnings
+from datetime import timedelta
+import numpy as np
+from jet_id_reader import parse_jet_id_bytes
+from jet_catalog import JET_CLASSES, HOURS_PER_STEP, get_catalog, contents_fingerprint
+from instrument import span
+
+# Set up vectors representing 2.5 deg lat, lon values for NCEP/NCAR reanalysis data (same as the binning scripts):
+LAT0 = 5.0      # First latitude of the jet ID data (5N)
+LON0 = -177.5   # First longitude of the binned arrays
+DLAT = 2.5      # Grid spacing in degrees
+DLON = 2.5
+NLAT = 33       # 5N to 85N
+NLON = 144      # -177.5 to 180
+lat = np.linspace(LAT0, LAT0 + DLAT * (NLAT - 1), NLAT)
+lon = np.linspace(LON0, LON0 + DLON * (NLON - 1), NLON)
+
+JET_ID_VALUE = 10 # Jet ID's are marked as a "10" rather than a "1" in the NCEP/NCAR Reanalysis 1 ID dataset
+GRID_TOLERANCE = 1e-3 # How far (in grid boxes) a coordinate may sit from a grid point and still be counted as on the grid
+
+
+# Warning issued for jet ID points that do not fall on the 2.5 deg grid
+class OffGridWarning(UserWarning):
+    pass
+
+
+# Convert vectors of latitude and longitude to grid indices with index arithmetic.
+# Longitudes wrap around, so 0-360 and -180-180 conventions both work (e.g. -180 and 180 land on the same column).
+# Returns (ilat, ilon, on_grid) where on_grid is False for points that are off the grid or outside 5N-85N.
+def grid_indices(lat_pts, lon_pts):
+    y = (np.asarray(lat_pts, dtype=np.float64) - LAT0) / DLAT
+    x = (np.asarray(lon_pts, dtype=np.float64) - LON0) / DLON
+    iy = np.rint(y)
+    ix = np.rint(x)
+    on_grid = (np.abs(y - iy) <= GRID_TOLERANCE) & (np.abs(x - ix) <= GRID_TOLERANCE) & (iy >= 0) & (iy < NLAT)
+    ilat = np.where(on_grid, iy, 0).astype(np.intp)
+    ilon = np.where(on_grid, np.mod(ix, NLON), 0).astype(np.intp)
+    return ilat, ilon, on_grid
+
+
+# Place 'value' in every grid box of 'matrix' that has a point in lat_pts/lon_pts, in one scatter.
+# 'matrix' is (lat x lon x ...) and 'index' is a tuple giving the position along the remaining dimensions, e.g. (day, hr) for the
+# (lat x lon x day x hr) arrays of the binning scripts or (t,) for a (lat x lon x time) array. Entries can be scalars or per-point vectors.
+# Points that are not on the grid are skipped, reported with an OffGridWarning and returned as (lat, lon) pairs.
+def bin_points(matrix, lat_pts, lon_pts, index, value=1):
+    ilat, ilon, on_grid = grid_indices(lat_pts, lon_pts)
+    if np.all(on_grid):
+        matrix[(ilat, ilon) + tuple(index)] = value
+        return np.empty((0, 2))
+    keep = np.flatnonzero(on_grid)
+    index = tuple(i if np.isscalar(i) else np.asarray(i)[keep] for i in index)
+    matrix[(ilat[keep], ilon[keep]) + index] = value
+    off_grid = np.column_stack((np.asarray(lat_pts)[~on_grid], np.asarray(lon_pts)[~on_grid]))
+    warnings.warn('%d jet ID point(s) not on the 2.5 deg grid were skipped: %s' % (len(off_grid), off_grid.tolist()), OffGridWarning, stacklevel=2)
+    return off_grid
+
+
+# Grid one file of jet ID data (a record array from jet_id_reader.read_jet_id_file) into 'matrix' at the given index (see bin_points).
+# Every grid box with a jet ID gets a '1'; returns the off-grid points as in bin_points.
+def bin_jet_ids(matrix, jet_data, *index):
+    jet_pts = jet_data[jet_data['id'] == JET_ID_VALUE]
+    return bin_points(matrix, jet_pts['lat'], jet_pts['lon'], index, value=1)
+
+
+# List of 6-hourly datetimes from 'start' up to (not including) 'end'
+def jet_time_axis(start, end):
+    steps = int((end - start).total_seconds() // (HOURS_PER_STEP * 3600))
+    return [start + timedelta(hours=HOURS_PER_STEP * t) for t in range(steps)]
+
+
+# Read and grid the ID file of every jet class for one time step; returns a (class x lat x lon) uint8 array.
+# Files are looked up in the catalog of 'data_dir' (see jet_catalog.py). With a 'fingerprints' dict, the fingerprint of every file
+# binned (jet_catalog.contents_fingerprint, from the bytes that were parsed) is stored in it by filename.
+def bin_jet_step(valid_time, data_dir, classes=JET_CLASSES, fingerprints=None):
+    catalog = get_catalog(data_dir)
+    grids = np.zeros((len(classes), NLAT, NLON), dtype=np.uint8)
+    for c, jet_class in enumerate(classes):
+        path = catalog.path(jet_class, valid_time)
+        with span('parse'):
+            with open(path, 'rb') as f:
+                raw = f.read()
+                st = os.fstat(f.fileno())
+            jet_data = parse_jet_id_bytes(raw, ids_only=True)
+        if fingerprints is not None:
+            fingerprints[os.path.basename(path)] = contents_fingerprint(st, raw)
+        with span('bin'):
+            bin_jet_ids(grids[c], jet_data)
+    return grids
+
+
+# Walk the time steps once and, for each one, read and grid the ID file of every jet class.
+# Returns a (class x lat x lon x time) uint8 array with a '1' at every ID point, classes in the order given (default polj, stj, ovrlp).
+# Missing files are reported (jet_catalog.MissingJetFilesError) before anything is read.
+def bin_jet_classes(times, data_dir, classes=JET_CLASSES):
+    if len(times) > 0:
+        with span('catalog_check'):
+            get_catalog(data_dir).check(times[0], times[-1] + timedelta(hours=HOURS_PER_STEP), classes)
+    jet_ids = np.zeros((len(classes), NLAT, NLON, len(times)), dtype=np.uint8)
+    for t, valid_time in enumerate(times):
+        jet_ids[..., t] = bin_jet_step(valid_time, data_dir, classes)
+    return jet_ids
@@ -0,0 +1,40 @@
+# This script bins the polar, subtropical and jet superposition ID .txt data for a long period (by default the whole 1979-2010 archive)
+# into one jet ID store such that all ID points are marked as a '1' and all non-ID points are marked as a '0'.
+# Each 6-hourly time step is appended to the store on disk as soon as it is binned, so memory use stays the same no matter how many
+# years are looped through. If the script is stopped part way, just run it again: it continues after the last time step in the store.
+# Running it again on a finished store brings the store up to date: only time steps whose .txt files were changed are re-binned.
+# Set 'workers' above 1 to bin a new store with that many processes (much faster on a multi-core machine).
+
+import os
+from datetime import datetime
+from jet_store import stream_jet_ids, bin_jet_ids_parallel, update_jet_ids, JetStore
+from instrument import start_run
+
+# New stores are binned by worker processes when workers > 1, which import this script again when they start on Windows
+# and macOS; everything below only runs when the script itself is run.
+if __name__ == '__main__':
+    # Record the time, CPU, bytes read and memory of each stage when NCEP_RUN_REPORT is set (and a cProfile dump with NCEP_RUN_PROFILE)
+    start_run('jet_binning_ncep_archive')
+
+    # Create our data folder if we need to.
+    currentFilePath = os.path.realpath(__file__)
+    currentDir = os.path.dirname(currentFilePath)
+    trgDir = currentDir + '/Data/'
+    if not os.path.exists(trgDir):
+        os.makedirs(trgDir)
+
+    startTime=datetime(1979,1,1,0) # First 6-hourly time to bin
+    endTime=datetime(2011,1,1,0) # Bin up to (not including) this time
+    filename_save=trgDir+"jet_ids_%d_%d_NCEP.jetid" % (startTime.year,endTime.year-1) # What you want to name your jet ID store
+
+    workers=1 # Number of processes to bin a new store with (1 = stream one time step at a time into the store)
+
+    if os.path.exists(filename_save):
+        updated=update_jet_ids(filename_save,trgDir,end=endTime,verbose=True) # Re-bin changed time steps, then append any missing ones
+        jet_store=JetStore(filename_save)
+        print("%d time steps re-binned or added" % len(updated))
+    elif workers>1:
+        jet_store=bin_jet_ids_parallel(filename_save,startTime,endTime,trgDir,workers=workers,verbose=True)
+    else:
+        jet_store=stream_jet_ids(filename_save,startTime,endTime,trgDir,verbose=True)
+    print("%d time steps from %s to %s in %s" % (jet_store.ntime,jet_store.start,jet_store.time_of(jet_store.ntime-1),filename_save))
@@ -0,0 +1,45 @@
+# This script loads one month of polar, subtropical and jet superposition ID .txt data and grids it into a single array such that all ID points are marked as a '1' and all non-ID points are marked as a '0'.
+# It replaces polar_binning_ncep_oct2010.py, subtropical_binning_ncep_oct2010.py and overlap_binning_ncep_oct2010.py: the calendar is walked
+# once and the polj, stj and ovrlp files of each 6-hourly time are read together.
+
+# Import plotting, number, pylab tools
+import matplotlib.pyplot as plt
+import numpy as np
+import os
+from datetime import datetime
+from jet_binning import lat, lon, JET_CLASSES, jet_time_axis, bin_jet_classes
+from jet_store import save_jet_ids
+from instrument import start_run
+
+# Record the time, CPU, bytes read and memory of each stage when NCEP_RUN_REPORT is set (and a cProfile dump with NCEP_RUN_PROFILE)
+start_run('jet_binning_ncep_oct2010')
+
+# Create our data folder if we need to.
+currentFilePath = os.path.realpath(__file__)
+currentDir = os.path.dirname(currentFilePath)
+trgDir = currentDir + '/Data/'
+if not os.path.exists(trgDir):
+    os.makedirs(trgDir)
+
+# For loop that reads in each .txt file of polar, subtropical and superposition ID data in the Northern Hemisphere and stores data within array 'jet_ids'
+for year in range(2010,2011): # Loop through all years of interest (end of range is last year you want plus 1)
+    times=jet_time_axis(datetime(year,10,1),datetime(year,11,1)) # 6-hourly times from 00Z 1 Oct. to 18Z 31 Oct. (any start/end date works; filenames are zero padded automatically)
+    jet_ids=bin_jet_classes(times,trgDir) # Array of dimensions class (polj, stj, ovrlp) x lat x lon x time with a '1' at every ID point
+    print(year) # This is to make sure the script is still running, since if you loop through many years, it takes a while
+    filename_save=trgDir+"jet_ids_oct_%d_NCEP.jetid" % (year) # What you want to name your file of ID's (all three classes in one file)
+    save_jet_ids(filename_save,jet_ids,times) # Save as a bit-packed, memory-mappable jet ID store (see jet_store.py)
+
+# Sum total number of ID's of each class for all dates/times; produce a plot below to see if script worked
+jet_sums=np.sum(jet_ids,axis=3)
+titles={'polj':'Polar','stj':'Subtropical Jet','ovrlp':'Superposition'}
+
+# Plot results
+for c,jet_class in enumerate(JET_CLASSES):
+    plt.subplot(len(JET_CLASSES),1,c+1)
+    fig1_plt=plt.contourf(lon,lat,jet_sums[c])
+    plt.ylabel('Latitude')
+    plt.title('Total Number of %s IDs' % titles[jet_class])
+    cb=plt.colorbar(fig1_plt)
+plt.xlabel('Longitude')
+plt.suptitle('Jet IDs over Northern Hemisphere for October %d' % year)
+plt.show()
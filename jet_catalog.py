@@ -0,0 +1,257 @@
+# This module keeps a catalog of the polj/stj/ovrlp-YYMMDDHH.txt jet ID files in a data folder.
+# The folder is scanned once and every filename is parsed into its jet class and datetime, so files are found by (class, datetime)
+# with a dictionary lookup instead of building the name by hand, and missing 6-hourly files are reported before any binning starts.
+# The catalog (filename, size, mtime) is saved to an index file in the folder; later runs reuse it as long as the folder still holds
+# the same jet ID files, which is checked from a listing of the names alone (no stat of every file). Other files written to the folder
+# (jet ID stores, manifests, climatologies) do not invalidate it.
+# SourceManifest records which files (and which versions of them, by size/mtime/CRC-32) went into a binned product, so the product
+# can later be brought up to date by re-binning only the time steps whose files changed. While a product is being binned, new entries
+# are appended to a journal next to the manifest, so checkpointing a long run costs only the new entries.
+
+import json
+import os
+import re
+import zlib
+from datetime import datetime, timedelta
+from atomic_file import replacing
+
+JET_CLASSES = ('polj', 'stj', 'ovrlp') # Polar, subtropical and jet superposition ID's; also the class order of stacked arrays
+HOURS_PER_STEP = 6 # The ID data is 6-hourly (00Z, 06Z, 12Z and 18Z)
+INDEX_NAME = '.jet_catalog.json' # Index file written to the data folder
+INDEX_VERSION = 1
+MANIFEST_SUFFIX = '.sources.json' # Appended to a product's filename to name its source manifest
+JOURNAL_SUFFIX = '.log' # Appended to a source manifest's filename to name its journal (one JSON [filename, fingerprint] per line)
+FILENAME_PATTERN = re.compile(r'^(polj|stj|ovrlp)-(\d{2})(\d{2})(\d{2})(\d{2})\.txt$')
+CENTURY_PIVOT = 50 # Two digit years at or above this are 19YY (the archive starts in 1979), below it 20YY
+
+
+# Name of the jet ID .txt file of one class (polj, stj or ovrlp) for a datetime, e.g. polj-10102612.txt for 12Z 26 Oct. 2010.
+# Every part of the YYMMDDHH stamp is zero padded, so this works for any year/month without editing.
+def jet_id_filename(jet_class, valid_time):
+    return '%s-%02d%02d%02d%02d.txt' % (jet_class, valid_time.year % 100, valid_time.month, valid_time.day, valid_time.hour)
+
+
+# Jet class and datetime of a jet ID filename, or None if the name is not a jet ID file
+def parse_jet_id_filename(filename):
+    match = FILENAME_PATTERN.match(os.path.basename(filename))
+    if match is None:
+        return None
+    yy, month, day, hour = [int(g) for g in match.groups()[1:]]
+    year = 1900 + yy if yy >= CENTURY_PIVOT else 2000 + yy
+    try:
+        return match.group(1), datetime(year, month, day, hour)
+    except ValueError: # e.g. a 31st of a 30 day month
+        return None
+
+
+# Raised when jet ID files needed for a period are not in the data folder; 'gaps' holds (class, first missing, last missing) ranges
+class MissingJetFilesError(IOError):
+
+    def __init__(self, data_dir, gaps):
+        self.gaps = gaps
+        shown = ['%s %s to %s' % (jet_class, first, last) for jet_class, first, last in gaps[:10]]
+        more = '' if len(gaps) <= 10 else ' (and %d more gaps)' % (len(gaps) - 10)
+        IOError.__init__(self, 'jet ID files missing from %s: %s%s' % (data_dir, '; '.join(shown), more))
+
+
+# Catalog of the jet ID files in 'data_dir'. Entries are keyed by (jet class, datetime) and hold (path, size, mtime).
+class JetCatalog(object):
+
+    def __init__(self, data_dir, rescan=False):
+        self.data_dir = data_dir
+        self.index_file = os.path.join(data_dir, INDEX_NAME)
+        self.entries = {}
+        if rescan or not self._load():
+            self.scan()
+
+    # Use the saved index if the folder holds the same jet ID files as when it was written (a file added, removed or renamed since
+    # changes the listing; a file rewritten under the same name is picked up by refresh())
+    def _load(self):
+        try:
+            with open(self.index_file, 'r') as f:
+                index = json.load(f)
+            names = set(filename for filename in os.listdir(self.data_dir) if FILENAME_PATTERN.match(filename))
+        except (IOError, OSError, ValueError):
+            return False
+        files = index.get('files') or {}
+        if index.get('version') != INDEX_VERSION or names != set(files):
+            return False
+        self.entries = {}
+        for filename, (size, mtime) in files.items():
+            self._add(filename, size, mtime)
+        return True
+
+    # List the folder, parse every jet ID filename and save the index
+    def scan(self):
+        self.entries = {}
+        for filename in os.listdir(self.data_dir):
+            if FILENAME_PATTERN.match(filename):
+                st = os.stat(os.path.join(self.data_dir, filename))
+                self._add(filename, st.st_size, st.st_mtime)
+        self.save()
+
+    def _add(self, filename, size, mtime):
+        parsed = parse_jet_id_filename(filename)
+        if parsed is not None:
+            self.entries[parsed] = (os.path.join(self.data_dir, filename), size, mtime)
+
+    # Write the index file (skipped quietly if the data folder is read-only)
+    def save(self):
+        files = dict((os.path.basename(path), [size, mtime]) for path, size, mtime in self.entries.values())
+        try:
+            with open(self.index_file, 'w') as f:
+                json.dump({'version': INDEX_VERSION, 'files': files}, f, sort_keys=True)
+        except (IOError, OSError):
+            pass
+
+    # Re-read the size and mtime of one file (e.g. when it may have been rewritten) and return its entry, or None if it is gone
+    def refresh(self, jet_class, valid_time):
+        path = os.path.join(self.data_dir, jet_id_filename(jet_class, valid_time))
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.entries.pop((jet_class, valid_time), None)
+            return None
+        self.entries[(jet_class, valid_time)] = (path, st.st_size, st.st_mtime)
+        return self.entries[(jet_class, valid_time)]
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    # (path, size, mtime) of the file for a class and datetime
+    def entry(self, jet_class, valid_time):
+        try:
+            return self.entries[(jet_class, valid_time)]
+        except KeyError:
+            raise MissingJetFilesError(self.data_dir, [(jet_class, valid_time, valid_time)])
+
+    def path(self, jet_class, valid_time):
+        return self.entry(jet_class, valid_time)[0]
+
+    # Sorted datetimes available for a class
+    def times(self, jet_class):
+        return sorted(t for c, t in self.entries if c == jet_class)
+
+    # Runs of consecutive missing 6-hourly files from 'start' up to (not including) 'end', as (class, first missing, last missing)
+    def gaps(self, start, end, classes=JET_CLASSES):
+        step = timedelta(hours=HOURS_PER_STEP)
+        gaps = []
+        for jet_class in classes:
+            first = None
+            valid_time = start
+            while valid_time < end:
+                if (jet_class, valid_time) not in self.entries:
+                    first = valid_time if first is None else first
+                elif first is not None:
+                    gaps.append((jet_class, first, valid_time - step))
+                    first = None
+                valid_time += step
+            if first is not None:
+                gaps.append((jet_class, first, valid_time - step))
+        return gaps
+
+    # Raise MissingJetFilesError listing every gap in the period, so a missing file stops a run before it starts
+    def check(self, start, end, classes=JET_CLASSES):
+        gaps = self.gaps(start, end, classes)
+        if gaps:
+            raise MissingJetFilesError(self.data_dir, gaps)
+
+
+# Catalogs already loaded by this process, one per data folder
+_catalogs = {}
+
+
+# Shared catalog for a data folder (loaded or scanned on first use; rescan=True re-lists the folder and re-reads every size/mtime)
+def get_catalog(data_dir, rescan=False):
+    key = os.path.realpath(data_dir)
+    if rescan or key not in _catalogs:
+        _catalogs[key] = JetCatalog(data_dir, rescan=rescan)
+    return _catalogs[key]
+
+
+# [size, mtime, CRC-32 of the contents] of a file
+def file_fingerprint(path):
+    st = os.stat(path)
+    crc = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            crc = zlib.crc32(block, crc)
+    return [st.st_size, st.st_mtime, crc & 0xffffffff]
+
+
+# file_fingerprint of a file from its os.stat result and the contents already read (e.g. by the binning), without reading it again
+def contents_fingerprint(st, contents):
+    return [st.st_size, st.st_mtime, zlib.crc32(contents) & 0xffffffff]
+
+
+# Fingerprints of the source files that went into a product, saved next to it as <product>.sources.json. Entries recorded since the
+# last save() can be appended to <product>.sources.json.log with checkpoint(), which is read back on top of the saved manifest.
+class SourceManifest(object):
+
+    def __init__(self, product_filename):
+        self.filename = product_filename + MANIFEST_SUFFIX
+        self.journal = self.filename + JOURNAL_SUFFIX
+        self.files = {}
+        self.unsaved = [] # Names recorded since the last checkpoint or save
+        try:
+            with open(self.filename, 'r') as f:
+                self.files = json.load(f)['files']
+        except (IOError, OSError, ValueError, KeyError):
+            self.files = {}
+        try:
+            with open(self.journal, 'r') as f:
+                for line in f:
+                    try:
+                        name, fingerprint = json.loads(line)
+                    except ValueError: # Last line cut short by a run that was stopped
+                        break
+                    self.files[name] = fingerprint
+        except (IOError, OSError):
+            pass
+
+    # Remember the current version of a source file, or the version with 'fingerprint' (see contents_fingerprint) if given
+    def record(self, path, fingerprint=None):
+        name = os.path.basename(path)
+        self.files[name] = file_fingerprint(path) if fingerprint is None else fingerprint
+        self.unsaved.append(name)
+
+    # True if the file is the version recorded. Size and mtime are checked first; if they differ the contents are compared by CRC-32,
+    # so a file that was only touched or copied (same bytes) does not count as changed.
+    def is_current(self, path):
+        recorded = self.files.get(os.path.basename(path))
+        if recorded is None:
+            return False
+        st = os.stat(path)
+        if st.st_size == recorded[0] and st.st_mtime == recorded[1]:
+            return True
+        if st.st_size != recorded[0]:
+            return False
+        current = file_fingerprint(path)
+        if current[2] != recorded[2]:
+            return False
+        self.files[os.path.basename(path)] = current
+        return True
+
+    def forget(self):
+        self.files = {}
+        self.unsaved = []
+
+    # Append the entries recorded since the last checkpoint or save to the journal; this writes only those entries, so it can be done
+    # often during a long run
+    def checkpoint(self):
+        if self.unsaved:
+            with open(self.journal, 'a') as f:
+                f.write(''.join(json.dumps([name, self.files[name]]) + '\n' for name in self.unsaved))
+            self.unsaved = []
+
+    # Write the whole manifest (to a temporary file first, so an interrupted save never leaves a half written manifest) and remove the
+    # journal, whose entries it now holds
+    def save(self):
+        with replacing(self.filename) as tmp, open(tmp, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'files': self.files}, f, sort_keys=True)
+        if os.path.exists(self.journal):
+            os.remove(self.journal)
+        self.unsaved = []
@@ -0,0 +1,111 @@
+# This module reads the polar (polj), subtropical (stj) and jet superposition (ovrlp) ID .txt files into typed NumPy columns.
+# Each file has one row per NCEP/NCAR 2.5 deg grid point from 5N to 85N (33 latitudes x 145 longitudes = 4785 rows) laid out as:
+#    index,    row,      latitude,      longitude,      jet ID
+# where the jet ID column is "10.00000" at ID points and "0.00000" everywhere else.
+# The rows are written with a fixed width, so rather than splitting every line into strings (csv.reader) we view the whole file as a
+# 2D byte array and convert each column of characters to numbers with array arithmetic.
+
+import numpy as np
+
+# Column layout of the returned record array
+JET_ID_DTYPE = np.dtype([('index', np.int32), ('row', np.int32), ('lat', np.float32), ('lon', np.float32), ('id', np.uint8)])
+JET_ID_FIELDS = JET_ID_DTYPE.names
+
+# Lookup table used by the fixed width parser: digits map to 0-9, the other characters allowed in a numeric field get their own code
+# and anything else is flagged as bad
+_COMMA = ord(',')
+_SPACE_CODE, _DOT_CODE, _MINUS_CODE, _BAD = 10, 11, 12, 13
+_CHAR_CODE = np.full(256, _BAD, dtype=np.uint8)
+_CHAR_CODE[ord('0'):ord('9') + 1] = np.arange(10)
+_CHAR_CODE[ord(' ')] = _SPACE_CODE
+_CHAR_CODE[ord('.')] = _DOT_CODE
+_CHAR_CODE[ord('-')] = _MINUS_CODE
+
+
+# Read one jet ID .txt file and return a record array with the fields 'index', 'row', 'lat', 'lon' and 'id'.
+# If ids_only is True only the rows with a non-zero jet ID are returned (~1-2% of the file).
+def read_jet_id_file(filename, ids_only=False):
+    with open(filename, 'rb') as f:
+        raw = f.read()
+    return parse_jet_id_bytes(raw, ids_only)
+
+
+# Parse the contents of a jet ID file that were already read (bytes), as read_jet_id_file does.
+def parse_jet_id_bytes(raw, ids_only=False):
+    try:
+        return _parse_fixed_width(raw, ids_only)
+    except ValueError:
+        return _parse_delimited(raw, ids_only) # Hand-edited or re-saved files may have lost the fixed width layout
+
+
+# Read several jet ID files and return a list of record arrays in the same order as the filenames.
+def read_jet_id_files(filenames, ids_only=False):
+    return [read_jet_id_file(filename, ids_only) for filename in filenames]
+
+
+# Split the file into a (rows x characters) byte array and convert each comma separated field column-wise.
+def _parse_fixed_width(raw, ids_only):
+    nl = raw.find(b'\n')
+    if nl < 0:
+        raise ValueError('not a fixed width jet ID file')
+    line_len = nl + 1 # Includes the '\r' of CRLF files checked out on Windows
+    if len(raw) % line_len != 0:
+        if len(raw) % line_len == line_len - 1 and not raw.endswith(b'\n'):
+            raw = raw + b'\n' # Last line is missing its newline
+        else:
+            raise ValueError('rows are not all the same width')
+    chars = np.frombuffer(raw, dtype=np.uint8).reshape(-1, line_len)
+
+    # Field boundaries come from the commas of the first row; every other row must have its commas in the same columns
+    commas = np.flatnonzero(chars[0] == _COMMA)
+    if len(commas) != len(JET_ID_FIELDS) - 1 or not np.all(chars[:, commas] == _COMMA):
+        raise ValueError('comma columns do not line up')
+    starts = np.concatenate(([0], commas + 1))
+    ends = np.concatenate((commas, [nl - 1 if raw[nl - 1:nl] == b'\r' else nl]))
+
+    if ids_only:
+        # A jet ID field is non-zero exactly when it contains a digit above '0', so the rows to keep are found without parsing
+        id_field = chars[:, starts[4]:ends[4]]
+        chars = chars[np.flatnonzero(id_field.max(axis=1) > ord('0'))]
+
+    data = np.empty(len(chars), dtype=JET_ID_DTYPE)
+    for k, name in enumerate(JET_ID_FIELDS):
+        values = _parse_column(chars[:, starts[k]:ends[k]])
+        data[name] = values if JET_ID_DTYPE[name].kind == 'f' else np.rint(values)
+    return data
+
+
+# Convert a (rows x width) block of right-aligned decimal characters (e.g. "   -177.5000") to float64 values.
+# The characters are walked one column at a time (left to right) building an exact integer mantissa for every row at once,
+# which is then divided by the power of ten given by the number of digits after the decimal point.
+def _parse_column(block):
+    codes = _CHAR_CODE[block.T] # (width x rows); contiguous per column so each step below is a flat vector operation
+    if np.any(codes == _BAD):
+        raise ValueError('unexpected character in numeric field')
+    nrow = codes.shape[1]
+    mantissa = np.zeros(nrow, dtype=np.int64)
+    decimals = np.zeros(nrow, dtype=np.int64)
+    after_dot = np.zeros(nrow, dtype=bool)
+    negative = np.zeros(nrow, dtype=bool)
+    for code in codes:
+        is_digit = code <= 9
+        mantissa = np.where(is_digit, mantissa * 10 + code, mantissa)
+        decimals += is_digit & after_dot
+        after_dot |= code == _DOT_CODE
+        negative |= code == _MINUS_CODE
+    values = mantissa / 10.0 ** decimals
+    return np.where(negative, -values, values)
+
+
+# Fallback for files that are not fixed width: treat commas as whitespace and let NumPy parse all numbers in one call.
+def _parse_delimited(raw, ids_only):
+    values = np.fromstring(raw.replace(b',', b' '), sep=' ')
+    if values.size % len(JET_ID_FIELDS) != 0:
+        raise ValueError('jet ID file does not have %d columns' % len(JET_ID_FIELDS))
+    values = values.reshape(-1, len(JET_ID_FIELDS))
+    if ids_only:
+        values = values[values[:, 4] != 0]
+    data = np.empty(len(values), dtype=JET_ID_DTYPE)
+    for k, name in enumerate(JET_ID_FIELDS):
+        data[name] = np.rint(values[:, k]) if k in (0, 1, 4) else values[:, k]
+    return data
@@ -0,0 +1,320 @@
+# This module stores binned jet ID arrays (class x lat x lon x time) in a compact binary file instead of np.savetxt .txt files.
+# The file starts with a small text header (grid, time axis and class names as JSON) followed by the ID grids in time order:
+# for every 6-hourly time step there is one grid per class, so any single (lat x lon) slice sits in one contiguous block of the file.
+# The data is memory-mapped, so reading one time step only touches that block instead of parsing the whole month.
+#
+# Stores can grow: append() adds time steps at the end of the file, which is how stream_jet_ids bins long periods (e.g. 1979-2010)
+# with constant memory use and picks up where an interrupted run stopped. bin_jet_ids_parallel instead sizes the store up front and
+# has a pool of worker processes bin blocks of time steps and write them straight into the memory-mapped file.
+# Both record the source files of every time step (jet_catalog.SourceManifest), and update_jet_ids uses that record to re-bin only
+# the time steps whose files changed and to append new ones.
+#
+# Two encodings are supported: 'bits' (default; 1 bit per grid box, 594 bytes per 33 x 144 grid) and 'uint8' (1 byte per grid box).
+
+import json
+import multiprocessing
+import os
+from datetime import datetime, timedelta
+import numpy as np
+from jet_binning import JET_CLASSES, HOURS_PER_STEP, LAT0, LON0, DLAT, DLON, NLAT, NLON, bin_jet_step
+from jet_catalog import get_catalog, SourceManifest
+from instrument import span
+
+MAGIC = b'NCEPJETID\n'  # First bytes of every jet ID store
+VERSION = 1
+HEADER_SIZE = 1024      # Header is padded to a fixed size so the data offset never changes when the header is rewritten
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+ENCODINGS = ('bits', 'uint8')
+
+
+# A memory-mapped jet ID store. Open an existing file with JetStore(filename) (add mode='r+' to modify it) or make a new one
+# with JetStore.create(...) / save_jet_ids(...).
+class JetStore(object):
+
+    def __init__(self, filename, mode='r'):
+        self.filename = filename
+        self.mode = mode
+        with open(filename, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if not header.startswith(MAGIC) or len(header) != HEADER_SIZE:
+            raise IOError('%s is not a jet ID store' % filename)
+        info = json.loads(header[len(MAGIC):].decode('ascii'))
+        self._info = info
+        if info['version'] > VERSION:
+            raise IOError('%s was written by a newer version (%d) of jet_store' % (filename, info['version']))
+        self.classes = tuple(info['classes'])
+        self.encoding = info['encoding']
+        self.start = datetime.strptime(info['start'], TIME_FORMAT)
+        self.step_hours = info['step_hours']
+        self.ntime = info['ntime']
+        grid = info['grid']
+        self.lat = np.linspace(grid['lat0'], grid['lat0'] + grid['dlat'] * (grid['nlat'] - 1), grid['nlat'])
+        self.lon = np.linspace(grid['lon0'], grid['lon0'] + grid['dlon'] * (grid['nlon'] - 1), grid['nlon'])
+        self._grid = grid
+        self.grid_size = grid['nlat'] * grid['nlon']
+        self.record_size = (self.grid_size + 7) // 8 if self.encoding == 'bits' else self.grid_size # Bytes per class per time step
+        self.step_size = self.record_size * len(self.classes) # Bytes per time step
+        self._data = None
+        self._map()
+
+    # Make a new (or overwrite an existing) store with room for 'ntime' all-zero time steps starting at 'start'.
+    @classmethod
+    def create(cls, filename, start, ntime=0, classes=JET_CLASSES, encoding='bits', step_hours=HOURS_PER_STEP):
+        if encoding not in ENCODINGS:
+            raise ValueError('encoding must be one of %s' % (ENCODINGS,))
+        info = {'version': VERSION, 'classes': list(classes), 'encoding': encoding, 'start': start.strftime(TIME_FORMAT),
+                'step_hours': step_hours, 'ntime': ntime,
+                'grid': {'lat0': LAT0, 'dlat': DLAT, 'nlat': NLAT, 'lon0': LON0, 'dlon': DLON, 'nlon': NLON}}
+        with open(filename, 'wb') as f:
+            f.write(_pack_header(info))
+            record_size = (NLAT * NLON + 7) // 8 if encoding == 'bits' else NLAT * NLON
+            f.truncate(HEADER_SIZE + ntime * len(classes) * record_size) # Sparse on most file systems; the zeros cost no I/O
+        return cls(filename, mode='r+')
+
+    # (Re)map the data section of the file
+    def _map(self):
+        self._data = None
+        if self.ntime > 0:
+            self._data = np.memmap(self.filename, dtype=np.uint8, mode=self.mode, offset=HEADER_SIZE,
+                                   shape=(self.ntime, len(self.classes), self.record_size))
+
+    # Memory map covering every time step, remapped if the store has grown since it was made
+    def _records(self):
+        if self._data is None or len(self._data) != self.ntime:
+            self._map()
+        return self._data
+
+    # Datetime of every time step in the store
+    @property
+    def times(self):
+        return [self.time_of(t) for t in range(self.ntime)]
+
+    def time_of(self, t):
+        return self.start + timedelta(hours=self.step_hours * t)
+
+    # Index of a time step given either an integer index or a datetime
+    def time_index(self, valid_time):
+        if isinstance(valid_time, datetime):
+            hours = (valid_time - self.start).total_seconds() / 3600.0
+            t = int(hours // self.step_hours)
+            if t * self.step_hours != hours:
+                raise KeyError('%s is not on the %d-hourly time axis of %s' % (valid_time, self.step_hours, self.filename))
+        else:
+            t = int(valid_time)
+        if t < 0 or t >= self.ntime:
+            raise KeyError('time %s is outside %s (%s to %s)' % (valid_time, self.filename, self.start, self.time_of(self.ntime - 1)))
+        return t
+
+    # One (lat x lon) ID grid for a jet class ('polj', 'stj' or 'ovrlp') at a time step (index or datetime)
+    def read(self, jet_class, valid_time):
+        return self._decode(self._records()[self.time_index(valid_time), self.classes.index(jet_class)])
+
+    # All classes at one time step: (class x lat x lon)
+    def read_time(self, valid_time):
+        return self._decode(self._records()[self.time_index(valid_time)])
+
+    # Time steps [t0, t1) of every class as a (class x lat x lon x time) array, the same layout bin_jet_classes returns
+    def read_all(self, t0=0, t1=None):
+        t1 = self.ntime if t1 is None else t1
+        if self.ntime == 0 or t1 <= t0:
+            return np.zeros((len(self.classes), self._grid['nlat'], self._grid['nlon'], 0), dtype=np.uint8)
+        return np.moveaxis(self._decode(self._records()[t0:t1]), 0, -1)
+
+    # Write the (class x lat x lon) grids of one time step
+    def write(self, valid_time, grids):
+        self._records()[self.time_index(valid_time)] = self._encode(grids)
+
+    # Write a whole (class x lat x lon x time) array starting at time step t0
+    def write_all(self, jet_ids, t0=0):
+        t1 = t0 + jet_ids.shape[-1]
+        if t1 > self.ntime:
+            raise KeyError('writing %d time steps at %d overflows %s (%d time steps)' % (jet_ids.shape[-1], t0, self.filename, self.ntime))
+        self._records()[t0:t1] = self._encode(np.moveaxis(jet_ids, -1, 0))
+
+    # Append the (class x lat x lon) grids of one time step to the end of the store.
+    # The grids are written before the header's time step count is bumped, so if a run is interrupted the store still ends cleanly at
+    # the last complete time step (any partly written step is simply overwritten by the next append).
+    def append(self, grids):
+        if self.mode == 'r':
+            raise IOError('%s is open read-only' % self.filename)
+        with open(self.filename, 'r+b') as f:
+            f.seek(HEADER_SIZE + self.ntime * self.step_size)
+            f.write(self._encode(grids).tobytes())
+            f.truncate()
+            f.flush()
+            self.ntime += 1
+            self._info['ntime'] = self.ntime
+            f.seek(0)
+            f.write(_pack_header(self._info))
+
+    def flush(self):
+        if self._data is not None:
+            self._data.flush()
+
+    def close(self):
+        self.flush()
+        self._data = None
+
+    # (... x class x lat x lon) 0/1 values -> (... x class x record_size) bytes
+    def _encode(self, grids):
+        grids = np.asarray(grids, dtype=np.uint8)
+        flat = grids.reshape(grids.shape[:-2] + (self.grid_size,))
+        if self.encoding == 'bits':
+            return np.packbits(flat != 0, axis=-1)
+        return flat
+
+    # (... x record_size) bytes -> (... x lat x lon) uint8 array (always a copy, safe to modify)
+    def _decode(self, records):
+        if self.encoding == 'bits':
+            flat = np.unpackbits(records, axis=-1)[..., :self.grid_size]
+        else:
+            flat = np.array(records)
+        return flat.reshape(records.shape[:-1] + (self._grid['nlat'], self._grid['nlon']))
+
+
+# Header bytes: magic, JSON description, space padding up to HEADER_SIZE and a final newline
+def _pack_header(info):
+    text = MAGIC + json.dumps(info, sort_keys=True).encode('ascii')
+    if len(text) > HEADER_SIZE - 1:
+        raise ValueError('jet ID store header is too long (%d classes?)' % len(info['classes']))
+    return text + b' ' * (HEADER_SIZE - 1 - len(text)) + b'\n'
+
+
+# Save a (class x lat x lon x time) ID array (e.g. from jet_binning.bin_jet_classes) with its 6-hourly time axis to a new store.
+def save_jet_ids(filename, jet_ids, times, classes=JET_CLASSES, encoding='bits'):
+    if jet_ids.shape[0] != len(classes) or jet_ids.shape[-1] != len(times):
+        raise ValueError('jet_ids is %s but there are %d classes and %d times' % (jet_ids.shape, len(classes), len(times)))
+    store = JetStore.create(filename, times[0], ntime=len(times), classes=classes, encoding=encoding)
+    store.write_all(jet_ids)
+    store.close()
+    return filename
+
+
+# Load a whole store back into memory as (class x lat x lon x time); use JetStore(filename).read(...) for single slices.
+def load_jet_ids(filename):
+    return JetStore(filename).read_all()
+
+
+# Bin every 6-hourly time step from 'start' up to (not including) 'end' straight into the store 'filename', one step at a time, so memory
+# use is the same for one month or the whole 1979-2010 archive. If the store already exists (e.g. an earlier run was interrupted) binning
+# resumes after its last complete time step; the existing store must start at 'start' and have the same classes.
+def stream_jet_ids(filename, start, end, data_dir, classes=JET_CLASSES, encoding='bits', verbose=False):
+    with span('catalog_check'):
+        get_catalog(data_dir).check(start, end, classes) # Report every missing file now rather than stopping years into the run
+    if os.path.exists(filename):
+        store = JetStore(filename, mode='r+')
+        if store.start != start or store.classes != tuple(classes) or store.step_hours != HOURS_PER_STEP:
+            raise ValueError('%s starts at %s with classes %s; cannot resume a run starting at %s with classes %s'
+                             % (filename, store.start, store.classes, start, tuple(classes)))
+    else:
+        store = JetStore.create(filename, start, ntime=0, classes=classes, encoding=encoding)
+    manifest = SourceManifest(filename)
+    _append_steps(store, manifest, end, data_dir, verbose)
+    manifest.save()
+    return store
+
+
+# Append time steps to 'store' until it reaches 'end', recording their source files in 'manifest' (checkpointed every ~month of steps)
+def _append_steps(store, manifest, end, data_dir, verbose=False):
+    valid_time = store.time_of(store.ntime)
+    while valid_time < end:
+        fingerprints = {}
+        grids = bin_jet_step(valid_time, data_dir, store.classes, fingerprints)
+        with span('store_write'):
+            store.append(grids)
+        for name, fingerprint in fingerprints.items():
+            manifest.record(name, fingerprint)
+        if store.ntime % 124 == 0:
+            manifest.checkpoint()
+        if verbose and valid_time.month == 1 and valid_time.day == 1 and valid_time.hour == 0:
+            print(valid_time.year) # This is to make sure the script is still running, since if you loop through many years, it takes a while
+        valid_time = store.time_of(store.ntime)
+
+
+# Bring an existing store up to date with the files in 'data_dir'. Time steps whose source files have changed since they were binned
+# (or that have no record in the store's source manifest) are re-binned and patched in place, and new 6-hourly time steps are appended
+# up to 'end' (default: as far as files for every class are available). Only the affected files are parsed, so keeping a rolling
+# archive current costs time in proportion to the new files. Returns the datetimes that were (re)binned.
+def update_jet_ids(filename, data_dir, end=None, verbose=False):
+    store = JetStore(filename, mode='r+')
+    catalog = get_catalog(data_dir, rescan=True) # Fresh sizes/mtimes; files rewritten in place do not change the folder
+    manifest = SourceManifest(filename)
+    catalog.check(store.start, store.time_of(store.ntime), store.classes)
+    updated = []
+    for t in range(store.ntime):
+        valid_time = store.time_of(t)
+        paths = [catalog.path(jet_class, valid_time) for jet_class in store.classes]
+        if not all(manifest.is_current(path) for path in paths):
+            fingerprints = {}
+            store.write(t, bin_jet_step(valid_time, data_dir, store.classes, fingerprints))
+            for name, fingerprint in fingerprints.items():
+                manifest.record(name, fingerprint)
+            updated.append(valid_time)
+    store.flush()
+    if end is None:
+        end = store.time_of(store.ntime)
+        while all((jet_class, end) in catalog for jet_class in store.classes):
+            end += timedelta(hours=store.step_hours)
+    catalog.check(store.time_of(store.ntime), end, store.classes)
+    first_new = store.ntime
+    _append_steps(store, manifest, end, data_dir, verbose)
+    updated.extend(store.time_of(t) for t in range(first_new, store.ntime))
+    manifest.save()
+    return updated
+
+
+# Bin every 6-hourly time step from 'start' up to (not including) 'end' into a new store 'filename' using 'workers' processes.
+# The store is created at its full size first; each worker opens its own memory map of it and writes the grids of the blocks of
+# 'chunk' time steps it is given directly into the file, so only block numbers travel between processes. Every time step is binned by
+# exactly one worker from its own files, so the result is identical (bit for bit) to the serial stream_jet_ids/bin_jet_classes result.
+def bin_jet_ids_parallel(filename, start, end, data_dir, classes=JET_CLASSES, encoding='bits', workers=None, chunk=124, verbose=False):
+    get_catalog(data_dir).check(start, end, classes) # Report every missing file now rather than stopping years into the run
+    ntime = int((end - start).total_seconds() // (HOURS_PER_STEP * 3600))
+    store = JetStore.create(filename, start, ntime=ntime, classes=classes, encoding=encoding)
+    store.close()
+    blocks = [(t0, min(t0 + chunk, ntime)) for t0 in range(0, ntime, chunk)]
+    workers = workers or multiprocessing.cpu_count()
+    manifest = SourceManifest(filename)
+    manifest.forget()
+    if workers == 1:
+        _init_worker(filename, data_dir, classes)
+        for block in blocks:
+            manifest.files.update(_bin_block(block)[1])
+        _worker.clear()
+    else:
+        pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(filename, data_dir, classes))
+        try:
+            for (t0, t1), fingerprints in pool.imap_unordered(_bin_block, blocks):
+                manifest.files.update(fingerprints)
+                if verbose:
+                    print('%s to %s' % (store.time_of(t0), store.time_of(t1 - 1)))
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    manifest.save()
+    return JetStore(filename)
+
+
+# State of each worker process in bin_jet_ids_parallel: its own writable map of the store plus where to find the ID files
+_worker = {}
+
+
+def _init_worker(filename, data_dir, classes):
+    _worker['store'] = JetStore(filename, mode='r+')
+    _worker['data_dir'] = data_dir
+    _worker['classes'] = classes
+
+
+# Bin time steps [t0, t1) into the worker's map of the store; returns the block (so the parent can report progress) and the
+# fingerprints of the files that went into it (small lists, merged into the parent's source manifest)
+def _bin_block(block):
+    store = _worker['store']
+    t0, t1 = block
+    fingerprints = {}
+    for t in range(t0, t1):
+        store.write(t, bin_jet_step(store.time_of(t), _worker['data_dir'], _worker['classes'], fingerprints))
+    store.flush()
+    return block, fingerprints
@@ -0,0 +1,280 @@
+# This module holds the figure code of the diagnostic map scripts as one renderer per product, so a product can be made on its own
+# (e.g. baroclinic_instability_map.py) or together with the others in one pass over the data (diagnostics_pipeline.run_products).
+# PRODUCTS lists, for every product, the variables and isobaric levels it needs, a function picking the fields it plots out of the
+# derived fields of one time step (diagnostics_pipeline.DerivedFields) and its renderer. Renderers take those fields, the latitudes and
+# longitudes of their rows and columns, the time index, the valid datetime and the folder to save the figure to; they only need plain
+# arrays, so frames can be drawn in other processes. The fields are drawn at their own coordinates, so a region read (e.g.
+# ncep_reader.MERCATOR_REGION) or the default jet latitudes land in the right place on any map.
+# Each product keeps the matplotlib settings its script used (rc_context), so products made in the same run do not affect each other.
+# Every product keeps its figure open between time steps (map_render.py): the map backgrounds and colorbars are drawn once per run and
+# each time step only redraws the contours and title.
+# Instead of saving each frame, renderers can return it as an RGBA array (set_frame_output) for writing into one animation file per
+# product (animation.py); a dpi can be set for quick low resolution previews either way.
+# Each product also names the figure file of a time step and lists its matplotlib style, so a run can tell which figures are already
+# up to date (frame_manifest.py).
+# The 250 hPa jet overlay and the anomaly maps (250mb_map_with_IDs_Oct_2010.py, 500mb_heightanomaly.py) have renderers here too, for the
+# command line driver (ncep_batch.py); they draw a new figure for every time step.
+
+import copy
+from collections import namedtuple
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+from map_render import get_basemap, MapFigure, MapPanel
+from baroclinic import SECONDS_PER_DAY
+from jet_binning import LON0, DLON
+
+Product = namedtuple('Product', ['variables', 'levels', 'fields', 'render', 'frame_name', 'style'])
+
+FIGURE_VERSION = 2 # Part of every figure's fingerprint (see frame_manifest.py): bump it when the figure code changes to redraw them all
+
+timeFormat = "%a %b %d %Y %H:%M"
+
+BI_LEVELS = (1000., 500., 250.) # Lower, middle and upper levels of the baroclinic instability map and triplot
+BV_LEVELS = (1000., 700., 500.) # Lower, middle and upper levels of the Brunt-Vaisala frequency map
+SHEAR_LEVELS = (1000., 500.)    # Lower and upper levels of the shear map
+
+BI_STYLE = {'savefig.dpi': 300, 'font.size': 20, 'xtick.labelsize': 12}
+TRIPLOT_STYLE = {'savefig.dpi': 300, 'font.size': 6, 'xtick.labelsize': 4}
+DEFAULT_STYLE = {}
+JET_OVERLAY_STYLE = {'font.size': 6}
+
+JET_WIND_LEVELS = [30,40,50,60,70,80,90,100] # Contour levels for wind at 250 hPa (m/s)
+JET_COLORS = {'polj': (0,0.5,0), 'stj': (1,0,0), 'ovrlp': (1,1,0)} # Polar = green, subtropical = red, superposition = gold
+# Name, units, contour limit and label interval of the anomaly maps of each variable; contours run from -limit to limit in 36 steps
+ANOMALY_FIELDS = {'hgt': ('Height', 'meters', 450., 50.), 'air': ('Temperature', 'K', 18., 2.),
+                  'uwnd': ('Zonal Wind', 'm/s', 36., 4.), 'vwnd': ('Meridional Wind', 'm/s', 36., 4.)}
+STANDARDIZED_ANOMALY = ('standard deviations', 4.5, 0.5)
+
+
+# Open figures of the products, kept between frames (see map_render.py); made by each product the first time it is drawn
+_figures = {}
+_basemap_cache = {'dir': None}
+_output = {'frames': False, 'dpi': None}
+
+
+# Keep pickled Basemaps in cache_dir between runs (None builds them every run)
+def set_basemap_cache(cache_dir):
+    _basemap_cache['dir'] = cache_dir
+
+
+# Return each frame as an RGBA array instead of saving it (frames=True), and/or draw frames at 'dpi' instead of the products' own
+# savefig.dpi (None)
+def set_frame_output(frames=False, dpi=None):
+    _output['frames'] = frames
+    _output['dpi'] = dpi
+
+
+# Settings of a rendering process (see diagnostics_pipeline.run_products)
+def init_renderer(cache_dir, frames=False, dpi=None):
+    set_basemap_cache(cache_dir)
+    set_frame_output(frames, dpi)
+
+
+# Close the figures kept open between frames
+def close_figures():
+    for figure in _figures.values():
+        figure.close()
+    _figures.clear()
+
+
+# Mercator map of the North Pacific / North America sector used by the baroclinic instability products
+def _mercator():
+    return get_basemap(_basemap_cache['dir'], projection='mill',llcrnrlon=120,llcrnrlat=20,urcrnrlon=300,urcrnrlat=70)
+
+
+# Orthographic view of the Northern Hemisphere used by the Brunt-Vaisala and shear maps
+def _orthographic():
+    return get_basemap(_basemap_cache['dir'], projection='ortho',lat_0=45,lon_0=-100,resolution='l')
+
+
+# Figure with a single map panel
+def _single_map(m, pRange, units):
+    fig = plt.figure()
+    return MapFigure(fig, [MapPanel(fig.add_subplot(111), m, pRange, units)])
+
+
+def _bc_instability_figure():
+    return _single_map(_mercator(), np.linspace(0.2, 3, 20, endpoint=True), 's^-1 (E-6)')
+
+
+def _brunt_vaisala_figure():
+    return _single_map(_orthographic(), np.linspace(500, 2000, 15, endpoint=True), 'day^-1')
+
+
+def _shear_figure():
+    return _single_map(_orthographic(), np.linspace(1, 1000, 15, endpoint=True), 'm/day')
+
+
+# BI on top, the stability and shear components below
+def _triplot_figure():
+    fig = plt.figure()
+    m = _mercator()
+    ax1 = plt.subplot2grid((2,2), (0,0), colspan=2, fig=fig)
+    ax2 = plt.subplot2grid((2,2), (1,0), fig=fig)
+    ax3 = plt.subplot2grid((2,2), (1,1), fig=fig)
+    ax1.title.set_text("Baroclinic Instability (Normalized)")
+    ax2.title.set_text("Baroclinic Stability Component (Normalized)")
+    ax3.title.set_text("Baroclinic Shear Component (Normalized)")
+    return MapFigure(fig, [MapPanel(ax1, m, np.linspace(0.2, 3, 20, endpoint=True), 's^-1 (E-6)'),
+                           MapPanel(ax2, m, np.linspace(500, 2000, 15, endpoint=True), 'day^-1'),
+                           MapPanel(ax3, m, np.linspace(1, 1000, 15, endpoint=True), 'm/day')])
+
+
+# The open figure of a product, made with make_figure() the first time
+def _figure(name, make_figure):
+    if name not in _figures:
+        _figures[name] = make_figure()
+    return _figures[name]
+
+
+# Draw a frame of product 'name' on its open figure and save it to figName, or return it (see set_frame_output)
+def _render(name, make_figure, fields, lat, lon, title, figName, **kwargs):
+    filename = None if _output['frames'] else figName
+    return _figure(name, make_figure).render(fields, lat, lon, title, filename, dpi=_output['dpi'], **kwargs)
+
+
+# Fields plotted by each product, from the derived fields of one time step (diagnostics_pipeline.DerivedFields), scaled for plotting
+def bc_instability_fields(derived):
+    return [derived.baroclinic_instability(*BI_LEVELS) * 100000]
+
+
+def brunt_vaisala_fields(derived):
+    return [derived.brunt_vaisala(*BV_LEVELS) * SECONDS_PER_DAY]
+
+
+def shear_fields(derived):
+    return [derived.shear(*SHEAR_LEVELS) * SECONDS_PER_DAY]
+
+
+def triplot_fields(derived):
+    return [derived.baroclinic_instability(*BI_LEVELS) * 100000, derived.brunt_vaisala(*BI_LEVELS) * SECONDS_PER_DAY,
+            derived.shear(BI_LEVELS[0], BI_LEVELS[2]) * SECONDS_PER_DAY]
+
+
+# Figure file name of each product for a time step (savefig adds the extension, see figure_path)
+def bc_instability_name(time, validTime):
+    return "bc_instability_" + validTime.strftime("%m-%d-%Y-%HZ")
+
+
+def brunt_vaisala_name(time, validTime):
+    return "brunt_vaisalla" + str(time)
+
+
+def shear_name(time, validTime):
+    return "shear_map" + str(time)
+
+
+def triplot_name(time, validTime):
+    return "bci_triplot_" + validTime.strftime("%m-%d-%Y-%HZ")
+
+
+# Path of the figure file product 'name' saves for a time step
+def figure_path(name, time, validTime, saveDir):
+    return saveDir + PRODUCTS[name].frame_name(time, validTime) + '.' + matplotlib.rcParams['savefig.format']
+
+
+# Baroclinic Instability map (baroclinic_instability_map.py)
+def plot_bc_instability(fields, lat, lon, time, validTime, saveDir):
+    BI_F, = fields
+    figName = saveDir + bc_instability_name(time, validTime)
+    with matplotlib.rc_context(BI_STYLE):
+        title = "Baroclinic Instability (" + validTime.strftime(timeFormat) + ")"
+        return _render('bi', _bc_instability_figure, [BI_F], lat, lon, title, figName, tight_layout=dict(pad=0.4, w_pad=0.5, h_pad=1.0),
+                       bbox_inches='tight')
+
+
+# Brunt-Vaisala Frequency map (brunt_vaisala.py)
+def plot_brunt_vaisala(fields, lat, lon, time, validTime, saveDir):
+    N, = fields
+    figName = saveDir + brunt_vaisala_name(time, validTime)
+    title = "Brunt-Vaisalla Frequency (" + validTime.strftime(timeFormat) + ") (Normalized)"
+    return _render('brunt_vaisala', _brunt_vaisala_figure, [N], lat, lon, title, figName)
+
+
+# BC Shear Term map (shear_map.py)
+def plot_shear(fields, lat, lon, time, validTime, saveDir):
+    Shear, = fields
+    figName = saveDir + shear_name(time, validTime)
+    title = "BC Shear Term (" + validTime.strftime(timeFormat) + ") (Normalized)"
+    return _render('shear', _shear_figure, [Shear], lat, lon, title, figName)
+
+
+# Baroclinic Components triplot: BI on top, the stability and shear components below (triplot_baroclinic.py)
+def plot_triplot(fields, lat, lon, time, validTime, saveDir):
+    BI_F, N, Shear = fields
+    figName = saveDir + triplot_name(time, validTime)
+    with matplotlib.rc_context(TRIPLOT_STYLE):
+        title = "Baroclinic Components (" + validTime.strftime(timeFormat) + ")"
+        return _render('triplot', _triplot_figure, [BI_F, N, Shear], lat, lon, title, figName)
+
+
+# Jet ID grids (class x lat x lon, 5N to 85N and 177.5W to 180 as read from a jet_store.JetStore) rolled so the 0 deg column comes
+# first and flipped to line up with the NCEP/NCAR grid (85N to 5N, 0 to 357.5E): the column at LON0 + DLON * j moves to j - 71 (mod 144)
+def jet_ids_on_ncep_grid(grids):
+    return np.flip(np.roll(grids, int(round(LON0 / DLON)), axis=-1), axis=-2)
+
+
+# 250 hPa wind speed (lat x lon) with the jet IDs of each class (a (class x lat x lon) grid on the same lat/lon, see jet_ids_on_ncep_grid)
+def plot_jet_overlay(speed, jet_ids, classes, lat, lon, validTime, saveDir):
+    figName = saveDir + "jet_overlay_250hPa_" + validTime.strftime("%m-%d-%Y-%HZ")
+    with matplotlib.rc_context(JET_OVERLAY_STYLE):
+        fig = plt.figure()
+        m = copy.copy(_orthographic()) # A Basemap keeps the map boundary it drew, which can only belong to one figure (see map_render.py)
+        for layer in ('coastlines', 'states', 'countries', 'mapboundary'):
+            getattr(m, 'draw' + layer)(ax=fig.gca())
+        x, y = m(*np.meshgrid(lon, lat))
+        m.contour(x, y, speed, JET_WIND_LEVELS, colors=[(0,0,1)], linewidths=2, ax=fig.gca())
+        for grid, jet_class in zip(jet_ids, classes):
+            if grid.any():
+                m.contour(x, y, grid, colors=[JET_COLORS[jet_class]], linewidths=1, ax=fig.gca())
+        fig.suptitle(validTime.strftime('%HZ %d %b. %Y') + ' 250 hPa Wind Speed (m/s) and Jet IDs '
+                     '(polar = green; subtropical = red; superposition = gold)')
+        fig.savefig(figName, dpi=_output['dpi'])
+        plt.close(fig)
+
+
+# Anomaly map of 'variable' at 'level' (lat x lon) from its climatology over 'years' (first, last); standardized anomalies are in
+# standard deviations
+def plot_anomaly(anomaly, lat, lon, variable, level, years, time, validTime, saveDir, standardized=False):
+    if variable in ANOMALY_FIELDS:
+        fieldName, units, limit, interval = ANOMALY_FIELDS[variable]
+    else: # Contours to the largest anomaly of the frame, no labels
+        fieldName, units, limit, interval = variable, '', float(np.nanmax(np.abs(anomaly))), 0.
+    if standardized:
+        units, limit, interval = STANDARDIZED_ANOMALY
+    anomalyRange = np.linspace(-limit, limit, 37, endpoint=True)
+    labelrange = [v for v in np.arange(-limit + interval, limit, interval) if abs(v) > interval / 2.] if interval else []
+    name = fieldName.lower().replace(' ', '_') + ('_standardized_' if standardized else '')
+    figName = saveDir + "%dhPa_%sanomaly" % (level, name) + str(time)
+    with matplotlib.rc_context({'savefig.dpi': 300}):
+        fig = plt.figure()
+        m = copy.copy(_mercator())
+        for layer in ('coastlines', 'countries', 'mapboundary'):
+            getattr(m, 'draw' + layer)(ax=fig.gca())
+        m.drawstates(linestyle = ':', ax=fig.gca())
+        x, y = m(*np.meshgrid(lon, lat))
+        cs = m.contourf(x, y, anomaly, anomalyRange, cmap=plt.cm.bwr, extend='both', ax=fig.gca())
+        cbar = m.colorbar(cs, location='bottom', pad="5%", ax=fig.gca())
+        cbar.set_label('Based on a %d-year %s mean \n %d-%d (%s)' % (years[1] - years[0] + 1, fieldName.lower(), years[0], years[1], units))
+        if labelrange:
+            cs = m.contour(x, y, anomaly, labelrange, linewidths = 0, colors = [(0,0,0)], ax=fig.gca())
+            fig.gca().clabel(cs, fmt="%1.0f" if interval >= 1 else "%1.1f", fontsize=6)
+        fig.suptitle("%dhPa %s Anomalies (" % (level, fieldName) + validTime.strftime("%H00z %d %b %Y") + ")")
+        fig.savefig(figName, dpi=_output['dpi'])
+        plt.close(fig)
+
+
+# Draw one frame of product 'name' from its fields (the work done per frame by each rendering process; see diagnostics_pipeline.py).
+# Returns the frame when frames are returned instead of saved (set_frame_output), else None.
+def render_frame(name, fields, lat, lon, time, validTime, saveDir):
+    return PRODUCTS[name].render(fields, lat, lon, time, validTime, saveDir)
+
+
+PRODUCTS = {
+    'bi': Product(('air', 'uwnd', 'vwnd', 'hgt'), BI_LEVELS, bc_instability_fields, plot_bc_instability, bc_instability_name,
+                  BI_STYLE),
+    'brunt_vaisala': Product(('air', 'hgt'), BV_LEVELS, brunt_vaisala_fields, plot_brunt_vaisala, brunt_vaisala_name, DEFAULT_STYLE),
+    'shear': Product(('uwnd', 'vwnd', 'hgt'), SHEAR_LEVELS, shear_fields, plot_shear, shear_name, DEFAULT_STYLE),
+    'triplot': Product(('air', 'uwnd', 'vwnd', 'hgt'), BI_LEVELS, triplot_fields, plot_triplot, triplot_name, TRIPLOT_STYLE),
+}
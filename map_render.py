@@ -0,0 +1,139 @@
+# This module keeps the parts of a map figure that are the same in every frame of a time loop, so each frame only draws its data.
+# Basemap instances are built once per projection (building the orthographic map takes ~2 s; a pickled copy can be kept on disk and
+# loads in a fraction of that), the projected x/y coordinates of a grid are computed once per projection and grid, and a figure's
+# axes, coastlines/states/countries/map boundary and colorbar are drawn once. Each frame then replaces the contour set and title and is
+# saved; the figure stays open for the next frame. A frame can also be returned as an RGBA array from the canvas instead of being
+# saved, for writing straight into an animation (see animation.py).
+
+import copy
+import hashlib
+import os
+import pickle
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+from mpl_toolkits.basemap import Basemap
+from atomic_file import replacing
+from instrument import span
+
+BACKGROUND = ('coastlines', 'states', 'countries', 'mapboundary') # Static layers drawn under the data (Basemap draw* methods)
+
+_basemaps = {}
+_grids = {}
+
+
+# Key of a projection from its Basemap arguments, e.g. projection='mill', llcrnrlon=120, ...
+def _projection_key(kwargs):
+    return tuple(sorted(kwargs.items()))
+
+
+# Basemap for the given arguments, built once per process. With a cache_dir, the Basemap is also pickled there and loaded from the
+# pickle in later runs instead of being rebuilt.
+def get_basemap(cache_dir=None, **kwargs):
+    key = _projection_key(kwargs)
+    if key not in _basemaps:
+        m = None
+        path = None
+        if cache_dir is not None:
+            path = os.path.join(cache_dir, 'basemap_%s.pickle' % hashlib.sha1(repr(key).encode('utf-8')).hexdigest())
+            try:
+                with open(path, 'rb') as f:
+                    m = pickle.load(f)
+            except (IOError, OSError, EOFError, pickle.UnpicklingError):
+                m = None
+        if m is None:
+            with span('basemap'):
+                m = Basemap(**kwargs)
+            if path is not None:
+                if not os.path.exists(cache_dir):
+                    os.makedirs(cache_dir)
+                # Rendering processes may all build the same Basemap at once; each writes its own temporary file and the last one wins
+                with replacing(path) as tmp, open(tmp, 'wb') as f:
+                    pickle.dump(m, f, pickle.HIGHEST_PROTOCOL)
+        _basemaps[key] = m
+    return _basemaps[key]
+
+
+# Projected x, y of the grid points at latitudes 'lat' and longitudes 'lon' (the rows and columns of the data), computed once per
+# projection and grid
+def projected_grid(m, lat, lon):
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    # Same for the copies made by MapPanel
+    key = (_projection_key(m.projparams), m.llcrnrx, m.llcrnry, m.urcrnrx, m.urcrnry, lat.tobytes(), lon.tobytes())
+    if key not in _grids:
+        _grids[key] = m(*np.meshgrid(lon, lat))
+    return _grids[key]
+
+
+# One map on an axes: the Basemap background is drawn when the panel is made, draw() replaces the filled contours of the data.
+# The colorbar is made from the first frame's contours; the contour levels and colormap are fixed, so it stays valid for every frame.
+# The panel draws with its own shallow copy of the Basemap (sharing the coastline and boundary data), because a Basemap keeps the map
+# boundary patch it drew and that patch can only belong to one axes.
+class MapPanel(object):
+
+    def __init__(self, ax, m, levels, units, cmap=None, background=BACKGROUND):
+        self.ax = ax
+        self.m = copy.copy(m)
+        m = self.m
+        self.levels = levels
+        self.units = units
+        self.cmap = cmap or plt.cm.jet
+        self.cs = None
+        self.cbar = None
+        for layer in background:
+            getattr(m, 'draw' + layer)(ax=ax)
+
+    # Draw 'field' (lat x lon), whose rows and columns are at latitudes 'lat' and longitudes 'lon'
+    def draw(self, field, lat, lon):
+        if self.cs is not None:
+            self.cs.remove()
+        x, y = projected_grid(self.m, lat, lon)
+        self.cs = self.m.contourf(x, y, field, self.levels, cmap=self.cmap, ax=self.ax)
+        if self.cbar is None:
+            self.cbar = self.m.colorbar(self.cs, location='bottom', pad="5%", ax=self.ax)
+            self.cbar.set_label(self.units)
+        return self.cs
+
+
+# A figure of MapPanels kept open between frames; render() draws one frame and saves it
+class MapFigure(object):
+
+    def __init__(self, fig, panels):
+        self.fig = fig
+        self.panels = panels
+        self.title = None
+
+    # Draw 'fields' (one per panel, all on the grid of latitudes 'lat' and longitudes 'lon'), set the suptitle and save to 'filename'
+    # (savefig keyword arguments are passed on).
+    # tight_layout, if given, is a dict of fig.tight_layout arguments applied once the frame is drawn.
+    # dpi overrides the savefig.dpi setting (e.g. for quick previews). With no filename, the frame is not saved but returned as an
+    # (height x width x 4) uint8 RGBA array of the whole figure; savefig arguments such as bbox_inches do not apply, so every frame
+    # has the same size.
+    def render(self, fields, lat, lon, title, filename=None, tight_layout=None, dpi=None, **kwargs):
+        if filename is None:
+            if dpi is None:
+                dpi = matplotlib.rcParams['savefig.dpi']
+            if dpi != 'figure':
+                self.fig.set_dpi(dpi)
+        with span('draw'):
+            for panel, field in zip(self.panels, fields):
+                panel.draw(field, lat, lon)
+        if self.title is None:
+            self.title = self.fig.suptitle(title)
+        else:
+            self.title.set_text(title)
+        if tight_layout is not None:
+            self.fig.tight_layout(**tight_layout)
+        if filename is not None:
+            if dpi is not None:
+                kwargs['dpi'] = dpi
+            with span('savefig'):
+                self.fig.savefig(filename, **kwargs)
+            return None
+        with span('canvas_draw'):
+            self.fig.canvas.draw()
+            return np.array(self.fig.canvas.buffer_rgba())
+
+    def close(self):
+        plt.close(self.fig)
@@ -0,0 +1,238 @@
+# Command line driver for the jet ID and map products, so a period or product can be run without editing the scripts:
+#
+#   python ncep_batch.py jets --start 2010-10-01 --end 2010-11-01
+#   python ncep_batch.py maps --start 2010-10-26 --end 2010-10-31T12 --products bi triplot --workers 4 --output auto --dpi 72
+#   python ncep_batch.py jet-overlay --start 2010-10-26T12 --end 2010-10-26T18 --store Data/jet_ids_oct_2010_NCEP.jetid
+#   python ncep_batch.py anomaly --start 2010-10-26 --end 2010-11-01 --variable hgt --level 500 --reference month
+#
+# Times are datetimes (YYYY-MM-DD, YYYY-MM-DDTHH, YYYY-MM-DDTHH:MM or YYYYMMDDHH); every command works on the 6-hourly times from
+# --start up to (not including) --end, which may run over several years. Paths default to the Data/, Figures/ and Cache/ folders next
+# to this file, as in the scripts. Run 'python ncep_batch.py <command> --help' for the options of each command.
+# --report run.json (or .csv) records the time, CPU, bytes read and memory of each stage and --profile run.prof a cProfile dump
+# (see instrument.py).
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+from ncep_reader import NCEPReader, MERCATOR_REGION, HOURS_PER_STEP, DEFAULT_BLOCK
+from field_cache import DEFAULT_MAX_BYTES
+from animation import DEFAULT_FPS
+from instrument import start_run, finish_run
+
+currentDir = os.path.dirname(os.path.realpath(__file__))
+DATA_DIR = os.path.join(currentDir, 'Data')
+SAVE_DIR = os.path.join(currentDir, 'Figures')
+CACHE_DIR = os.path.join(currentDir, 'Cache')
+TIME_FORMATS = ('%Y-%m-%d', '%Y-%m-%dT%H', '%Y-%m-%dT%H:%M', '%Y-%m-%d %H', '%Y-%m-%d %H:%M', '%Y%m%d%H')
+OUTPUTS = ('figures', 'auto', 'mp4', 'gif', 'png') # One figure per time step, or one animation per product (see animation.py)
+MERCATOR_PRODUCTS = ('bi', 'triplot')              # Products drawn on the 120E-300E Mercator map (map_products._mercator)
+
+
+# Datetime from a command line argument
+def parse_time(text):
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.strptime(text, time_format)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError('%r is not a date/time; use e.g. 2010-10-26 or 2010-10-26T12' % text)
+
+
+# Region from a command line argument: 'auto', 'none', 'mercator' or lat_min,lat_max,lon_min,lon_max
+def parse_region(text):
+    if text in ('auto', 'none', 'mercator'):
+        return text
+    try:
+        region = tuple(float(v) for v in text.split(','))
+    except ValueError:
+        region = ()
+    if len(region) != 4:
+        raise argparse.ArgumentTypeError('%r is not a region; use auto, none, mercator or lat_min,lat_max,lon_min,lon_max' % text)
+    return region
+
+
+# (year, start, end) of each year of the period [start, end), for the yearly .nc files
+def year_ranges(start, end):
+    ranges = []
+    t0 = start
+    while t0 < end:
+        t1 = min(end, datetime(t0.year + 1, 1, 1))
+        ranges.append((t0.year, t0, t1))
+        t0 = t1
+    return ranges
+
+
+# Folder path with a trailing separator (the renderers add file names to it), made if needed
+def _folder(path):
+    if not os.path.exists(path):
+        os.makedirs(path)
+    return os.path.join(path, '')
+
+
+# FramePool drawing the jet overlay or anomaly figures at 'dpi' with 'workers' processes
+def _frames(workers, dpi):
+    from diagnostics_pipeline import FramePool
+    from map_products import init_renderer
+    return FramePool(workers, init_renderer, (None, False, dpi))
+
+
+# Bin the jet ID .txt files of the period into a jet ID store (see jet_binning_ncep_archive.py): an existing store is brought up to date
+def run_jets(args):
+    from jet_store import stream_jet_ids, bin_jet_ids_parallel, update_jet_ids, JetStore
+    jet_dir = args.jet_dir or args.data_dir
+    last = args.end - timedelta(hours=HOURS_PER_STEP)
+    store = args.store or os.path.join(args.data_dir, 'jet_ids_%d_%d_NCEP.jetid' % (args.start.year, last.year))
+    if os.path.exists(store):
+        updated = update_jet_ids(store, jet_dir, end=args.end, verbose=args.verbose)
+        jet_store = JetStore(store)
+        print("%d time steps re-binned or added" % len(updated))
+    elif args.workers > 1:
+        jet_store = bin_jet_ids_parallel(store, args.start, args.end, jet_dir, workers=args.workers, verbose=args.verbose)
+    else:
+        jet_store = stream_jet_ids(store, args.start, args.end, jet_dir, verbose=args.verbose)
+    print("%d time steps from %s to %s in %s" % (jet_store.ntime, jet_store.start, jet_store.time_of(jet_store.ntime - 1), store))
+
+
+# BI, Brunt-Vaisala, shear and triplot maps through diagnostics_pipeline.run_products, one run per year of the period
+def run_maps(args):
+    from diagnostics_pipeline import run_products
+    region = args.region
+    if region == 'auto':
+        region = MERCATOR_REGION if all(name in MERCATOR_PRODUCTS for name in args.products) else None
+    elif region == 'mercator':
+        region = MERCATOR_REGION
+    elif region == 'none':
+        region = None
+    animation = None if args.output == 'figures' else args.output
+    save_dir = _folder(args.save_dir)
+    for year, start, end in year_ranges(args.start, args.end):
+        steps = run_products(args.data_dir, year, start, end, args.products, save_dir, block=args.block, cache_dir=args.cache_dir,
+                             max_cache_bytes=args.max_cache_bytes, workers=args.workers, prefetch=args.prefetch, region=region,
+                             animation=animation, dpi=args.dpi, fps=args.fps, force=args.force)
+        if args.verbose:
+            print("%d: %d time steps" % (year, steps))
+
+
+# 250 hPa wind speed with the polar, subtropical and superposition jet IDs of a jet ID store, one figure per time step
+def run_jet_overlay(args):
+    from baroclinic import wind_speed
+    from jet_store import JetStore
+    from map_products import plot_jet_overlay, jet_ids_on_ncep_grid
+    store = JetStore(args.store)
+    save_dir = _folder(args.save_dir)
+    frames = _frames(args.workers, args.dpi)
+    try:
+        for year, start, end in year_ranges(args.start, args.end):
+            reader = NCEPReader(args.data_dir, year, ('uwnd', 'vwnd'), levels=(250,))
+            try:
+                for t, fields in reader.iter_steps(reader.time_index(start), reader.time_index(end), block=args.block):
+                    valid_time = reader.valid_time(t)
+                    speed = wind_speed(fields['uwnd'][0], fields['vwnd'][0])
+                    jet_ids = jet_ids_on_ncep_grid(store.read_time(valid_time))
+                    frames.draw(None, plot_jet_overlay, speed, jet_ids, store.classes, reader.lat, reader.lon, valid_time, save_dir)
+            finally:
+                reader.close()
+        frames.finish()
+    except BaseException:
+        frames.terminate()
+        raise
+
+
+# Anomaly maps of a variable at a level from its climatology (see climatology.ClimatologyStore), built first if needed
+def run_anomaly(args):
+    from climatology import ClimatologyStore, calendar_window
+    from map_products import plot_anomaly
+    store = ClimatologyStore(args.climatology_dir or os.path.join(args.data_dir, 'Climatology'), args.data_dir)
+    if (args.variable, args.level) not in store or args.rebuild:
+        store.build(args.variable, args.level, range(args.years[0], args.years[1] + 1), workers=args.workers)
+    climatology = store.get(args.variable, args.level)
+    years = (min(climatology.info['years']), max(climatology.info['years']))
+    window = None
+    if args.reference == 'month': # Every 6-hourly slot of the month the period starts in
+        first = datetime(args.start.year, args.start.month, 1)
+        window = calendar_window(first, datetime(first.year + first.month // 12, first.month % 12 + 1, 1))
+    save_dir = _folder(args.save_dir)
+    frames = _frames(args.workers, args.dpi)
+    try:
+        for valid_time, anomaly in store.iter_anomalies(args.variable, args.level, args.start, args.end, args.standardized, window,
+                                                        block=args.block):
+            time = int((valid_time - datetime(valid_time.year, 1, 1)).total_seconds() // (HOURS_PER_STEP * 3600))
+            frames.draw(None, plot_anomaly, anomaly, climatology.lat, climatology.lon, args.variable, args.level, years, time,
+                        valid_time, save_dir, args.standardized)
+        frames.finish()
+    except BaseException:
+        frames.terminate()
+        raise
+
+
+def make_parser():
+    from map_products import PRODUCTS
+    parser = argparse.ArgumentParser(description='Jet ID binning and NCEP/NCAR Reanalysis 1 map products for a period.')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--start', type=parse_time, required=True, help='first 6-hourly time, e.g. 2010-10-26T12')
+    common.add_argument('--end', type=parse_time, required=True, help='end of the period (not included)')
+    common.add_argument('--data-dir', default=DATA_DIR, help='folder of the .nc and jet ID files (default: %(default)s)')
+    common.add_argument('--workers', type=int, default=1, help='worker processes (default: %(default)s)')
+    common.add_argument('--block', type=int, default=DEFAULT_BLOCK, help='time steps read per NetCDF call (default: %(default)s)')
+    common.add_argument('-v', '--verbose', action='store_true')
+    common.add_argument('--report', help='write the time, CPU, bytes read and peak memory of each stage to this .json or .csv file')
+    common.add_argument('--profile', help='write a cProfile dump of the run to this file')
+    figures = argparse.ArgumentParser(add_help=False)
+    figures.add_argument('--save-dir', default=SAVE_DIR, help='folder the figures are saved to (default: %(default)s)')
+    figures.add_argument('--dpi', type=float, default=None, help="figure resolution, e.g. 72 for a quick preview (default: each product's)")
+
+    jets = commands.add_parser('jets', parents=[common], help='bin jet ID .txt files into a jet ID store')
+    jets.add_argument('--store', help='jet ID store to write or update (default: <data-dir>/jet_ids_<first year>_<last year>_NCEP.jetid)')
+    jets.add_argument('--jet-dir', help='folder of the polj/stj/ovrlp .txt files (default: --data-dir)')
+    jets.set_defaults(run=run_jets)
+
+    maps = commands.add_parser('maps', parents=[common, figures], help='baroclinic instability, Brunt-Vaisala, shear and triplot maps')
+    maps.add_argument('--products', nargs='+', choices=sorted(PRODUCTS), default=sorted(PRODUCTS), help='products to make (default: all)')
+    maps.add_argument('--output', choices=OUTPUTS, default='figures',
+                      help='one figure per time step, or one animation per product (auto = mp4 with ffmpeg, else gif)')
+    maps.add_argument('--fps', type=float, default=DEFAULT_FPS, help='animation frames per second (default: %(default)s)')
+    maps.add_argument('--cache-dir', default=CACHE_DIR, help='derived field cache (default: %(default)s)')
+    maps.add_argument('--no-cache', dest='cache_dir', action='store_const', const=None, help='read and compute every field')
+    maps.add_argument('--max-cache-bytes', type=int, default=DEFAULT_MAX_BYTES, help='field cache size cap (default: %(default)s)')
+    maps.add_argument('--prefetch', type=int, default=0, help='blocks read ahead in a background thread (default: %(default)s)')
+    maps.add_argument('--region', type=parse_region, default='auto',
+                      help='grid boxes read: lat_min,lat_max,lon_min,lon_max, mercator, none (jet latitudes all around) or auto '
+                           '(mercator when every product is drawn on the Mercator map; the default)')
+    maps.add_argument('--force', action='store_true', help='redraw figures that are up to date')
+    maps.set_defaults(run=run_maps)
+
+    overlay = commands.add_parser('jet-overlay', parents=[common, figures], help='250 hPa wind speed with the jet IDs')
+    overlay.add_argument('--store', required=True, help='jet ID store covering the period (see the jets command)')
+    overlay.set_defaults(run=run_jet_overlay)
+
+    anomaly = commands.add_parser('anomaly', parents=[common, figures], help='anomaly maps from a climatology')
+    anomaly.add_argument('--variable', default='hgt', help='air, uwnd, vwnd or hgt (default: %(default)s)')
+    anomaly.add_argument('--level', type=float, default=500., help='isobaric level in hPa (default: %(default)g)')
+    anomaly.add_argument('--years', type=int, nargs=2, default=(1981, 2010), metavar=('FIRST', 'LAST'),
+                         help='years of the climatology, if it has to be built (default: 1981 2010)')
+    anomaly.add_argument('--reference', choices=('slot', 'month'), default='month',
+                         help="anomalies from the mean of each 6-hourly calendar slot or of the period's first month (default: %(default)s)")
+    anomaly.add_argument('--standardized', action='store_true', help='divide the anomalies by the standard deviation')
+    anomaly.add_argument('--climatology-dir', help='climatology store (default: <data-dir>/Climatology)')
+    anomaly.add_argument('--rebuild', action='store_true', help='build the climatology again even if it exists')
+    anomaly.set_defaults(run=run_anomaly)
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    if args.end <= args.start:
+        sys.exit('--end (%s) must be after --start (%s)' % (args.end, args.start))
+    start_run(args.command, args.report, args.profile)
+    try:
+        args.run(args)
+    finally:
+        finish_run()
+
+
+if __name__ == '__main__':
+    main()
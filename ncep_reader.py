@@ -0,0 +1,213 @@
+# This module reads NCEP/NCAR Reanalysis 1 pressure level files (air.YYYY.nc, uwnd.YYYY.nc, vwnd.YYYY.nc, hgt.YYYY.nc, ...) for the
+# diagnostic map scripts. Instead of indexing every variable separately for every time step (variables['air'][time,:,2:35,:] inside the
+# time loop), a block of consecutive time steps is read for each variable in one call, aligned to the file's chunking along time, and
+# the loop is handed ready-decoded (scaled, missing values as NaN) arrays one time step at a time.
+# Only the requested isobaric levels are read: e.g. levels=(1000, 500, 250) resolves the three levels to their indices once and pulls
+# just those levels from disk instead of all 17.
+# A region (lat_min, lat_max, lon_min, lon_max) limits the read to the grid boxes of a lat/lon box, e.g. MERCATOR_REGION for the sector
+# plotted by the Mercator maps. Boxes may cross the 0/360 meridian (e.g. lon 300 to 60); the two pieces are read separately and joined
+# so the longitudes still increase across the box.
+# NC Files Can be Obtained From: ftp://ftp.cdc.noaa.gov/Datasets/ncep.reanalysis/
+
+import os
+import queue
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from netCDF4 import Dataset # This is important for reading in netCDF4 files below
+from instrument import span
+
+DIAGNOSTIC_VARIABLES = ('air', 'uwnd', 'vwnd', 'hgt') # Air temperature (K), u-wind, v-wind (m/s) and geopotential height (m)
+JET_LATS = slice(2, 35) # Python index values 2:35 select 85N to 5N, the latitude range of the jet ID data (33 latitudes)
+HOURS_PER_STEP = 6      # 1460 (1464 in leap years) 6-hrly times starting at 00Z 1 Jan.
+DEFAULT_BLOCK = 40      # Time steps read per variable per call (40 x 17 x 33 x 144 x 4 bytes = 13 MB for float32 data)
+DEFAULT_PREFETCH = 1    # Blocks read ahead by PrefetchingStepReader
+MERCATOR_REGION = (20., 70., 120., 300.) # lat_min, lat_max, lon_min, lon_max of the Mercator maps (llcrnrlat=20 ... urcrnrlon=300)
+
+
+# Index slices covering a region in the file's latitude and longitude vectors: returns (lat slice, [lon slices], longitudes).
+# Latitudes may run either way (the NCEP files go from 90N to 90S). Longitudes are taken modulo 360, so lon_min may be negative or the
+# box may run past 360 (lon_max < lon_min also means it crosses the 0/360 meridian); the returned longitudes increase across the box.
+def region_slices(lat, lon, region):
+    lat_min, lat_max, lon_min, lon_max = [float(v) for v in region]
+    lat = np.asarray(lat, dtype=np.float64)
+    rows = np.flatnonzero((lat >= lat_min) & (lat <= lat_max))
+    if len(rows) == 0:
+        raise ValueError('no grid latitudes between %g and %g' % (lat_min, lat_max))
+    lon = np.asarray(lon, dtype=np.float64)
+    width = (lon_max - lon_min) % 360 or (360. if lon_max != lon_min else 0.)
+    offset = (lon - lon_min) % 360 # Distance east of lon_min of every grid longitude
+    cols = np.flatnonzero(offset <= width + 1e-6)
+    if len(cols) == 0:
+        raise ValueError('no grid longitudes between %g and %g' % (lon_min, lon_max))
+    cols = cols[np.argsort(offset[cols], kind='stable')] # Order from lon_min eastwards
+    breaks = np.flatnonzero(np.diff(cols) != 1) + 1
+    lon_slices = [slice(int(piece[0]), int(piece[-1]) + 1) for piece in np.split(cols, breaks)]
+    return slice(int(rows[0]), int(rows[-1]) + 1), lon_slices, lon_min + offset[cols]
+
+
+# Reader for one year of several variables, e.g. NCEPReader(trgDir, 2010) opens air/uwnd/vwnd/hgt.2010.nc in trgDir.
+class NCEPReader(object):
+
+    def __init__(self, data_dir, year, variables=DIAGNOSTIC_VARIABLES, levels=None, lats=JET_LATS, region=None):
+        self.data_dir = data_dir
+        self.year = year
+        self.variables = tuple(variables)
+        self.region = region
+        self.paths = dict((name, os.path.join(data_dir, '%s.%d.nc' % (name, year))) for name in self.variables)
+        self.files = dict((name, Dataset(self.paths[name])) for name in self.variables)
+        first = self.files[self.variables[0]]
+        self.all_levels = first.variables['level'][:] # Vector of isobaric levels in the files (17)
+        self._levels, self._level_order = self._resolve_levels(levels)
+        self.level = self.all_levels[self._levels][self._level_order] # Vector of the isobaric levels read, in the order requested
+        if region is None:
+            self.lats = lats
+            self.lons = [slice(None)]
+            self.lon = first.variables['lon'][:] # Vector of longitude values (144 longitudes)
+        else: # The region replaces the latitude selection
+            self.lats, self.lons, self.lon = region_slices(first.variables['lat'][:], first.variables['lon'][:], region)
+        self.lat = first.variables['lat'][self.lats] # Vector of the selected latitudes
+        self.ntime = len(first.dimensions['time'])
+
+    def close(self):
+        for nc_file in self.files.values():
+            nc_file.close()
+
+    # Turn requested pressure levels (hPa) into what to index the level dimension with: a slice if the levels are next to each other in
+    # the file, otherwise a sorted index list. Also returns the order to put the levels read back into the requested order.
+    def _resolve_levels(self, levels):
+        if levels is None:
+            return slice(None), slice(None)
+        index = []
+        for p in levels:
+            found = np.flatnonzero(self.all_levels == p)
+            if len(found) == 0:
+                raise ValueError('%s hPa is not one of the levels in the files: %s' % (p, [float(level) for level in self.all_levels]))
+            index.append(int(found[0]))
+        sorted_index = sorted(set(index))
+        order = [sorted_index.index(i) for i in index]
+        if sorted_index == list(range(sorted_index[0], sorted_index[-1] + 1)):
+            return slice(sorted_index[0], sorted_index[-1] + 1), order
+        return sorted_index, order
+
+    # Datetime of a time index, and the time index of a datetime
+    def valid_time(self, t):
+        return datetime(self.year, 1, 1) + timedelta(hours=HOURS_PER_STEP * t)
+
+    def time_index(self, valid_time):
+        return int((valid_time - datetime(self.year, 1, 1)).total_seconds() // (HOURS_PER_STEP * 3600))
+
+    # Number of time steps per chunk of a variable (1 for contiguous or unchunked files)
+    def time_chunk(self, name):
+        chunking = self.files[name].variables[name].chunking()
+        return 1 if chunking == 'contiguous' or chunking is None else chunking[0]
+
+    # Time steps per read for iter_steps/StepReader: 'block' rounded up to whole chunks of the variables
+    def block_length(self, variables=None, block=DEFAULT_BLOCK):
+        chunk = max(self.time_chunk(name) for name in (variables or self.variables))
+        return max(chunk, -(-block // chunk) * chunk)
+
+    # What part of the grid is read, e.g. for cache keys
+    def selection_key(self):
+        return repr((self.lats, self.lons))
+
+    # Read time steps [t0, t1) of each variable in one call per variable (two when the region crosses the 0/360 meridian).
+    # Returns {variable: (time x level x lat x lon) array} with missing values as NaN; the level axis follows self.level.
+    def read_block(self, t0, t1, variables=None):
+        block = {}
+        for name in (variables or self.variables):
+            variable = self.files[name].variables[name]
+            with span('netcdf_read'):
+                pieces = [np.ma.asarray(variable[t0:t1, self._levels, self.lats, lons]) for lons in self.lons]
+            data = (pieces[0] if len(pieces) == 1 else np.ma.concatenate(pieces, axis=-1))[:, self._level_order]
+            block[name] = np.ma.filled(data.astype(np.result_type(data.dtype, np.float32)), np.nan) # Same dtype as a direct read
+        return block
+
+    # Loop over time steps [start, end), yielding (time index, {variable: (level x lat x lon) array}) for each one.
+    # Data is read 'block' time steps at a time (rounded up to whole chunks and aligned to chunk boundaries), so a month of 6-hrly
+    # data takes a handful of reads per variable.
+    def iter_steps(self, start, end, variables=None, block=DEFAULT_BLOCK):
+        variables = variables or self.variables
+        block = self.block_length(variables, block)
+        t0 = start
+        while t0 < end:
+            t1 = min(end, (t0 // block + 1) * block) # Up to the next block boundary
+            data = self.read_block(t0, t1, variables)
+            for t in range(t0, t1):
+                yield t, dict((name, data[name][t - t0]) for name in variables)
+            t0 = t1
+
+
+# Time steps read on demand, for loops that may not need the data of every step (e.g. when its derived fields are cached).
+# step(t) returns {variable: (level x lat x lon) array} for time index t; the first request for a step reads the block from t up to the
+# next block boundary (as iter_steps does, never past 'end'), so stepping through a range in order reads each block once.
+class StepReader(object):
+
+    def __init__(self, reader, end, variables=None, block=DEFAULT_BLOCK):
+        self.reader = reader
+        self.end = end
+        self.variables = variables or reader.variables
+        self.block = reader.block_length(self.variables, block)
+        self.t0 = self.t1 = 0
+        self.data = None
+
+    def step(self, t):
+        if self.data is None or not self.t0 <= t < self.t1:
+            self.t0 = t
+            self.t1 = max(t + 1, min(self.end, (t // self.block + 1) * self.block))
+            self.data = self.reader.read_block(self.t0, self.t1, self.variables)
+        return dict((name, self.data[name][t - self.t0]) for name in self.variables)
+
+
+# StepReader that reads ahead: a background thread reads the blocks of [start, end) in order into a queue holding at most 'depth'
+# blocks, while the caller works on the current one. The next block is then usually ready when it is needed, so waiting on the disk
+# (or a network mount) overlaps with computing and plotting. At most depth + 2 blocks are in memory: the queued ones, the one being read
+# and the one in use. Only the background thread touches the files until close() is called.
+# Steps must be asked for in increasing order. Unlike StepReader every block is read, even when a caller ends up not needing it.
+class PrefetchingStepReader(object):
+
+    def __init__(self, reader, start, end, variables=None, block=DEFAULT_BLOCK, depth=DEFAULT_PREFETCH):
+        self.reader = reader
+        self.end = end
+        self.variables = variables or reader.variables
+        self.block = reader.block_length(self.variables, block)
+        self.t0 = self.t1 = start
+        self.data = None
+        self.queue = queue.Queue(maxsize=max(1, depth))
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._read_ahead, args=(start,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _read_ahead(self, t0):
+        try:
+            while t0 < self.end and not self._stop.is_set():
+                t1 = min(self.end, (t0 // self.block + 1) * self.block)
+                self._put((t0, t1, self.reader.read_block(t0, t1, self.variables)))
+                t0 = t1
+        except BaseException as e: # Handed to the caller, who raises it at the step that needed the block
+            self._put(e)
+
+    # Queue an item, giving up if close() is called while the queue is full
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def step(self, t):
+        if t < self.t0 or t >= self.end:
+            raise IndexError('time step %d is not ahead of the prefetched range %d-%d' % (t, self.t0, self.end))
+        while self.data is None or t >= self.t1:
+            item = self.queue.get()
+            if isinstance(item, BaseException):
+                raise item
+            self.t0, self.t1, self.data = item
+        return dict((name, self.data[name][t - self.t0]) for name in self.variables)
+
+    # Stop the background thread (after it finishes the block it is reading)
+    def close(self):
+        self._stop.set()
+        self.thread.join()
@@ -0,0 +1,150 @@
+# This module writes synthetic stand-ins for the input data, for benchmarking (benchmark.py) and trying the scripts out without the
+# reanalysis archive:
+#  - uwnd/vwnd/air/hgt.YYYY.nc laid out like the NCEP/NCAR Reanalysis 1 pressure level files: 6-hourly time x 17 levels x 73 latitudes
+#    (90N to 90S) x 144 longitudes (0 to 357.5E), packed as short integers with scale_factor/add_offset and compressed one time step
+#    per chunk. The fields have the right magnitudes and structure (heights and temperatures falling with pressure and latitude,
+#    subtropical and polar jets near 250 hPa, travelling waves, some noise) so the diagnostics see realistic values.
+#  - polj/stj/ovrlp-YYMMDDHH.txt jet ID files in the fixed width layout of the ID dataset (33 x 145 rows from 5N to 85N), with meandering
+#    polar and subtropical jets marked over part of the hemisphere and superposition IDs where the two meet: ~1% of the points, as in
+#    the real files.
+# 'scale' sets the fraction of the year written (1.0 = the full 1460/1464 time steps, ~1 GB per variable once decoded).
+
+import os
+from datetime import datetime, timedelta
+import numpy as np
+from netCDF4 import Dataset
+from atomic_file import replacing
+from jet_catalog import JET_CLASSES, HOURS_PER_STEP, jet_id_filename
+
+NCEP_LEVELS = (1000., 925., 850., 700., 600., 500., 400., 300., 250., 200., 150., 100., 70., 50., 30., 20., 10.)
+NCEP_LAT = np.linspace(90., -90., 73)
+NCEP_LON = np.arange(144) * 2.5
+# Units, scale_factor and add_offset of each variable, as in the NCEP/NCAR files
+PACKING = {'air': ('degK', 0.01, 477.66), 'hgt': ('m', 1., 32066.), 'uwnd': ('m/s', 0.01, 202.66), 'vwnd': ('m/s', 0.01, 202.66)}
+JET_ID_LAT = np.linspace(5., 85., 33)                                     # Rows of the jet ID files
+JET_ID_LON = np.r_[np.arange(73) * 2.5, np.arange(-177.5, 0.1, 2.5)]      # 0 to 180, -177.5 to 0 (145 columns)
+JET_ID_LINE = '%8d,%8d,%15.4f,%15.4f,%15.5f\n'
+BLOCK = 40 # Time steps generated and written per call
+
+
+# Number of 6-hourly time steps in a year
+def steps_in_year(year):
+    return (datetime(year + 1, 1, 1) - datetime(year, 1, 1)).days * 24 // HOURS_PER_STEP
+
+
+# Latitude (deg) of the polar and subtropical jet axes at longitudes 'lon' (deg) and time step 't' (slowly travelling meanders)
+def jet_axes(lon, t):
+    lon = np.radians(lon)
+    polar = 52. + 9. * np.sin(4 * lon - 0.05 * t) + 5. * np.sin(7 * lon + 0.11 * t)
+    subtropical = 30. + 4. * np.sin(3 * lon + 0.03 * t)
+    return polar, subtropical
+
+
+# (time x level x lat x lon) float32 arrays of 'variables' for time steps t (an array of indices), on the NCEP/NCAR grid
+def synthetic_fields(t, variables=('air', 'hgt', 'uwnd', 'vwnd'), seed=0):
+    rng = np.random.RandomState(seed + int(t[0]))
+    p = np.array(NCEP_LEVELS).reshape(1, -1, 1, 1)
+    lat = NCEP_LAT.reshape(1, 1, -1, 1)
+    lon = NCEP_LON.reshape(1, 1, 1, -1)
+    tt = np.asarray(t, dtype=np.float64).reshape(-1, 1, 1, 1)
+    shape = (len(t), len(NCEP_LEVELS), len(NCEP_LAT), len(NCEP_LON))
+    coslat = np.cos(np.radians(lat))
+    wave = np.cos(np.radians(3 * lon) - 0.04 * tt) * coslat # Travelling planetary wave
+    polar, subtropical = jet_axes(lon, tt)
+    fields = {}
+    for name in variables:
+        noise = rng.standard_normal(shape)
+        if name == 'air':
+            field = np.maximum(288. * (p / 1000.) ** 0.19, 212.) - 35. * (lat / 90.) ** 2 * (p / 1000.) + 4. * wave + 0.5 * noise
+        elif name == 'hgt':
+            field = (7900. * np.log(1013.25 / p) - 400. * np.log(1013.25 / p) * np.tanh((np.abs(lat) - 45.) / 15.)
+                     + 60. * wave * np.log(1013.25 / p) + 3. * noise)
+        elif name == 'uwnd':
+            upper = np.exp(-np.log(p / 250.) ** 2 / 0.6) # Peaks near 250 hPa
+            field = (upper * (45. * np.exp(-((np.abs(lat) - subtropical) / 6.) ** 2) + 30. * np.exp(-((np.abs(lat) - polar) / 7.) ** 2))
+                     + 5. * coslat + 1.5 * noise)
+        elif name == 'vwnd':
+            field = 12. * np.sin(np.radians(3 * lon) - 0.04 * tt) * coslat * np.sqrt(1000. / p) ** 0.5 + 1.5 * noise
+        else:
+            raise ValueError('no synthetic %s; choose from %s' % (name, ', '.join(sorted(PACKING))))
+        fields[name] = np.asarray(field, dtype=np.float32)
+    return fields
+
+
+# Write <name>.<year>.nc for every variable with the first 'scale' of the year's time steps; returns {variable: path}.
+# Existing files with the same number of time steps are kept.
+def write_ncep_year(data_dir, year, scale=1.0, variables=('air', 'hgt', 'uwnd', 'vwnd'), zlib=True, seed=0):
+    ntime = max(1, int(round(steps_in_year(year) * scale)))
+    paths = {}
+    for name in variables:
+        path = os.path.join(data_dir, '%s.%d.nc' % (name, year))
+        paths[name] = path
+        if os.path.exists(path):
+            with Dataset(path) as nc_file:
+                if len(nc_file.dimensions['time']) == ntime:
+                    continue
+        units, scale_factor, add_offset = PACKING[name]
+        with replacing(path) as tmp, Dataset(tmp, 'w', format='NETCDF4_CLASSIC') as nc_file:
+            nc_file.createDimension('time', None)
+            nc_file.createDimension('level', len(NCEP_LEVELS))
+            nc_file.createDimension('lat', len(NCEP_LAT))
+            nc_file.createDimension('lon', len(NCEP_LON))
+            time = nc_file.createVariable('time', 'f8', ('time',))
+            time.units = 'hours since 1800-01-01 00:00:0.0'
+            nc_file.createVariable('level', 'f4', ('level',))[:] = NCEP_LEVELS
+            nc_file.createVariable('lat', 'f4', ('lat',))[:] = NCEP_LAT
+            nc_file.createVariable('lon', 'f4', ('lon',))[:] = NCEP_LON
+            data = nc_file.createVariable(name, 'i2', ('time', 'level', 'lat', 'lon'), zlib=zlib,
+                                          chunksizes=(1, len(NCEP_LEVELS), len(NCEP_LAT), len(NCEP_LON)))
+            data.units = units
+            data.scale_factor = scale_factor
+            data.add_offset = add_offset
+            hours0 = (datetime(year, 1, 1) - datetime(1800, 1, 1)).total_seconds() / 3600.
+            for t0 in range(0, ntime, BLOCK):
+                t = np.arange(t0, min(ntime, t0 + BLOCK))
+                time[t0:t[-1] + 1] = hours0 + HOURS_PER_STEP * t
+                data[t0:t[-1] + 1] = synthetic_fields(t, (name,), seed)[name]
+    return paths
+
+
+# (class x lat x lon) boolean grids of jet ID points on the jet ID grid (JET_ID_LAT x JET_ID_LON) at time step t
+def synthetic_jet_ids(t, classes=JET_CLASSES):
+    rng = np.random.RandomState(int(t))
+    polar, subtropical = jet_axes(JET_ID_LON, t)
+    lon = np.radians(JET_ID_LON)
+    # Each jet is only strong enough to be identified along part of the hemisphere
+    segments = {'polj': np.sin(2 * lon + 0.07 * t + rng.uniform(0, 1)) > 0.3, 'stj': np.sin(lon - 0.02 * t + rng.uniform(0, 1)) > 0.1}
+    rows = {'polj': np.rint((polar - JET_ID_LAT[0]) / 2.5).astype(int), 'stj': np.rint((subtropical - JET_ID_LAT[0]) / 2.5).astype(int)}
+    # Superposition where both jets are present within two grid boxes of each other
+    rows['ovrlp'] = (rows['polj'] + rows['stj']) // 2
+    segments['ovrlp'] = segments['polj'] & segments['stj'] & (np.abs(rows['polj'] - rows['stj']) <= 2)
+    grids = np.zeros((len(classes), len(JET_ID_LAT), len(JET_ID_LON)), dtype=bool)
+    for c, jet_class in enumerate(classes):
+        cols = np.flatnonzero(segments[jet_class])
+        grids[c, np.clip(rows[jet_class][cols], 0, len(JET_ID_LAT) - 1), cols] = True
+    return grids
+
+
+# Lines of a jet ID file with and without an ID at every point, in file order
+def _jet_id_lines():
+    lines = {}
+    for value in (0., 10.):
+        lines[value] = np.array([JET_ID_LINE % (j + 1, i + 1, lat, lon, value)
+                                 for i, lat in enumerate(JET_ID_LAT) for j, lon in enumerate(JET_ID_LON)], dtype=object)
+    return lines
+
+
+# Write the polj/stj/ovrlp .txt files of every 6-hourly time from 'start' up to (not including) 'end'; returns the number of files
+def write_jet_id_files(data_dir, start, end, classes=JET_CLASSES):
+    lines = _jet_id_lines()
+    count = 0
+    valid_time = start
+    t = 0
+    while valid_time < end:
+        for jet_class, grid in zip(classes, synthetic_jet_ids(t, classes)):
+            with open(os.path.join(data_dir, jet_id_filename(jet_class, valid_time)), 'w') as f:
+                f.write(''.join(np.where(grid.ravel(), lines[10.], lines[0.])))
+            count += 1
+        valid_time += timedelta(hours=HOURS_PER_STEP)
+        t += 1
+    return count